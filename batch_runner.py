@@ -6,18 +6,34 @@ from datetime import datetime
 from pathlib import Path
 from config import Config
 from main import process_single_file
+from core.estimate import add_estimates, format_estimate
+from core.usage import TokenBudgetExceeded, format_summary, merge_summaries
 
 class BatchProcessor:
-    def __init__(self, config_file=None):
+    def __init__(self, config_file=None, retry_failed=False, run_dir=None, estimate=False, token_budget=None):
         self.config_file = config_file
+        self.retry_failed = retry_failed
+        self.estimate = estimate
+        # Shared by all files of the batch (0 disables)
+        self.token_budget = Config.TOKEN_BUDGET if token_budget is None else token_budget
         self.input_dir = Path(Config.BATCH_INPUT_DIR)
         self.output_dir = Path(Config.BATCH_OUTPUT_DIR)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Create timestamped batch run directory
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        self.batch_run_dir = self.output_dir / f"batch_run_{timestamp}"
-        self.batch_run_dir.mkdir(parents=True, exist_ok=True)
+        if retry_failed:
+            # Retry inside an existing run: the given one, or the most recent
+            if run_dir:
+                self.batch_run_dir = Path(run_dir)
+            else:
+                previous_runs = sorted(p for p in self.output_dir.glob("batch_run_*") if p.is_dir())
+                if not previous_runs:
+                    raise FileNotFoundError(f"No previous batch run found in {self.output_dir}")
+                self.batch_run_dir = previous_runs[-1]
+        else:
+            # Create timestamped batch run directory
+            self.batch_run_dir = self.output_dir / f"batch_run_{timestamp}"
+            self.batch_run_dir.mkdir(parents=True, exist_ok=True)
         
         # Log file remains in the main output directory
         self.batch_log_file = self.output_dir / f"batch_run_{timestamp}.log"
@@ -39,6 +55,8 @@ class BatchProcessor:
         self.log(f"Starting batch processing...")
         self.log(f"Input Directory: {self.input_dir}")
         self.log(f"Output Directory: {self.output_dir}")
+        if self.retry_failed:
+            self.log(f"Retrying failed blocks in: {self.batch_run_dir}")
 
         config = self.load_config()
         files_to_process = []
@@ -64,25 +82,51 @@ class BatchProcessor:
 
         success_count = 0
         fail_count = 0
+        batch_usage = None
+        batch_estimate = None
+        tokens_used = 0
 
         for i, file_path in enumerate(files_to_process):
             self.log(f"{'='*50}")
             self.log(f"Processing file {i+1}/{len(files_to_process)}: {file_path.name}")
+            if self.token_budget and not self.estimate and tokens_used >= self.token_budget:
+                self.log(f"🛑 Token budget of {self.token_budget} used up; stopping the batch before {file_path.name}.")
+                break
             
             try:
                 # Use the batch run directory as the output directory
                 # magic-pdf will handle creating the subfolder for the file
                 target_output_dir = self.batch_run_dir
                 
-                await process_single_file(
+                state = await process_single_file(
                     input_file=str(file_path),
                     output_dir=str(target_output_dir),
                     preset='all', # Default to full pipeline
                     resume=True,  # Always try to resume if state exists
-                    check=False
+                    check=False,
+                    retry_failed=self.retry_failed,
+                    estimate=self.estimate,
+                    token_budget=self.token_budget - tokens_used if self.token_budget else 0
                 )
                 self.log(f"✅ Successfully processed: {file_path.name}")
                 success_count += 1
+                translation_estimate = (state or {}).get('estimate') if self.estimate else None
+                if translation_estimate:
+                    for line in format_estimate(translation_estimate):
+                        self.log(f"🧮 {line}")
+                    batch_estimate = add_estimates(batch_estimate, translation_estimate)
+                # Only what Step 5 spent now: a resumed file's earlier translate_stats were charged already
+                tokens_used += (state or {}).get('run_tokens', 0)
+                usage = (state or {}).get('usage')
+                if usage:
+                    for line in format_summary(usage):
+                        self.log(f"🧾 {line}")
+                    batch_usage = merge_summaries(batch_usage, usage)
+            except TokenBudgetExceeded:
+                self.log(f"🛑 Token budget of {self.token_budget} reached while processing {file_path.name}; "
+                         f"stopping the batch. Rerun (with a larger budget) to continue where it stopped.")
+                fail_count += 1
+                break
             except Exception as e:
                 self.log(f"❌ Failed to process: {file_path.name}")
                 self.log(f"Error: {str(e)}")
@@ -94,12 +138,31 @@ class BatchProcessor:
         self.log(f"{'='*50}")
         self.log("Batch processing completed.")
         self.log(f"Total: {len(files_to_process)}, Success: {success_count}, Failed: {fail_count}")
+        if batch_estimate:
+            self.log("Estimate for the whole batch:")
+            for line in format_estimate(batch_estimate):
+                self.log(f"🧮 {line}")
+            if self.token_budget and batch_estimate['total_tokens'] > self.token_budget:
+                self.log(f"⚠️  Exceeds the token budget of {self.token_budget}")
+        if batch_usage:
+            self.log("Usage for the whole batch:")
+            # Latency percentiles do not add up across files; they are in each file's summary
+            for line in format_summary(dict(batch_usage, latency=None)):
+                self.log(f"🧾 {line}")
         self.log(f"Log saved to: {self.batch_log_file}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Batch Bilingual ePUB Maker")
     parser.add_argument("--config", help="Path to batch configuration file (json)")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-translate only failed or suspicious blocks of a previous run")
+    parser.add_argument("--run-dir", help="Batch run directory to retry (default: the most recent batch_run_*)")
+    parser.add_argument("--estimate", action="store_true", help="Prepare every file and estimate translation tokens, cost and time without translating")
+    parser.add_argument("--token-budget", type=int, help="Token budget for the whole batch (overrides TOKEN_BUDGET)")
     args = parser.parse_args()
 
-    processor = BatchProcessor(args.config)
-    asyncio.run(processor.run())
+    processor = BatchProcessor(args.config, retry_failed=args.retry_failed, run_dir=args.run_dir,
+                               estimate=args.estimate, token_budget=args.token_budget)
+    try:
+        asyncio.run(processor.run())
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,61 @@
+"""
+Benchmark Step 5 dispatch memory: peak traced memory of translate_blocks for a
+growing number of text blocks, with the network call replaced by a stub that
+still builds the full request payload.
+
+Usage:
+    python benchmarks/bench_dispatch.py [--blocks N ...] [--workers N]
+
+Per-block memory should stay close to the size of the results themselves:
+the work queue's workers pop pending requests from a heap of index lists, so
+work in flight is bounded by the number of workers.
+"""
+import argparse
+import asyncio
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from core.dispatch import translate_blocks
+from core.translator import Translator
+
+
+async def fake_request(self, text, specific_glossary=None, packed=False, sources=None, masked=False):
+    Config.get_payload(text, specific_glossary, packed=packed, masked=masked)
+    await asyncio.sleep(0.001)
+    return "译文" + text[:8], Config.MODEL_NAME
+
+
+async def run(block_count: int) -> float:
+    translator = Translator()
+    texts = [f"Paragraph {i}: " + "the spectrum of the quasar shows broad lines " * 10 for i in range(block_count)]
+    try:
+        tracemalloc.start()
+        await translate_blocks(translator, texts)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        await translator.close()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate-stage memory benchmark")
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1000, 10000, 30000], help="Block counts to run")
+    parser.add_argument("--workers", type=int, default=Config.MAX_CONCURRENCY, help="Concurrent requests")
+    args = parser.parse_args()
+
+    Config.TM_ENABLED = False
+    Config.MAX_CONCURRENCY = args.workers
+    Translator._make_request = fake_request
+
+    for block_count in args.blocks:
+        peak = asyncio.run(run(block_count))
+        print(f"{block_count:>7} blocks: peak {peak / 1e6:7.1f} MB ({peak / block_count / 1024:.2f} KB/block)")
+
+
+if __name__ == "__main__":
+    main()
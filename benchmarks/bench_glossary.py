@@ -0,0 +1,61 @@
+"""
+Benchmark glossary term extraction: per-variant regex scan vs. Aho-Corasick matcher.
+
+Usage:
+    python benchmarks/bench_glossary.py [markdown_file] [--blocks N] [--regex-blocks N]
+
+The regex scan compiles one pattern per glossary variant for every block, so it
+is only run on a small sample (--regex-blocks); both timings are reported per block.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from core.glossary import GlossaryLoader
+from core.processor import MarkdownProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Glossary matcher benchmark")
+    parser.add_argument("markdown_file", nargs="?", default="debug_md.txt", help="Markdown input to sample text blocks from")
+    parser.add_argument("--blocks", type=int, default=3000, help="Number of text blocks for the matcher run")
+    parser.add_argument("--regex-blocks", type=int, default=20, help="Number of text blocks for the regex run")
+    args = parser.parse_args()
+
+    glossary_path = Path(Config.ASSETS_DIR) / (Config.GLOSSARY_FILENAME or "astrodict241020_ec.txt")
+    start = time.perf_counter()
+    glossary = GlossaryLoader(str(glossary_path))
+    load_time = time.perf_counter() - start
+    print(f"Glossary: {len(glossary)} terms, {len(glossary.matcher.check)} automaton slots, loaded in {load_time:.2f}s")
+
+    processor = MarkdownProcessor()
+    blocks = [b.content for b in processor.parse(processor.load_markdown(args.markdown_file)) if b.type == 'text']
+    if not blocks:
+        print("No text blocks found.")
+        return
+    sample = (blocks * (args.blocks // len(blocks) + 1))[:args.blocks]
+    regex_sample = sample[:args.regex_blocks]
+
+    start = time.perf_counter()
+    matcher_results = [glossary.get_relevant_terms(text) for text in sample]
+    matcher_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    regex_results = [glossary._get_relevant_terms_regex(text) for text in regex_sample]
+    regex_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(matcher_results, regex_results) if a != b)
+    matcher_per_block = matcher_time / len(sample) * 1000
+    regex_per_block = regex_time / len(regex_sample) * 1000
+
+    print(f"Matcher: {len(sample)} blocks in {matcher_time:.3f}s ({matcher_per_block:.3f} ms/block)")
+    print(f"Regex:   {len(regex_sample)} blocks in {regex_time:.3f}s ({regex_per_block:.3f} ms/block)")
+    print(f"Speedup: {regex_per_block / matcher_per_block:.0f}x, mismatches on shared blocks: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
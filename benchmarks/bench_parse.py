@@ -0,0 +1,62 @@
+"""
+Benchmark markdown parsing: first-character dispatch vs. the four-regex reference parser
+kept in tests/regex_parser.py.
+
+Usage:
+    python benchmarks/bench_parse.py [markdown_file] [--lines N] [--repeat N]
+
+The input is repeated up to --lines lines. Both parsers run on the same text, and
+the timing shared by both, splitting lines and building ContentBlocks, is reported
+separately so the line classification itself can be compared.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from core.processor import ContentBlock, MarkdownProcessor
+from regex_parser import iter_blocks_regex
+
+
+def best_time(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown parser benchmark")
+    parser.add_argument("markdown_file", nargs="?", default="debug_md.txt", help="Markdown input to repeat")
+    parser.add_argument("--lines", type=int, default=100_000, help="Number of input lines")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per parser (the best one is reported)")
+    args = parser.parse_args()
+
+    processor = MarkdownProcessor()
+    lines = processor.load_markdown(args.markdown_file).split('\n')
+    text = '\n'.join((lines * (args.lines // len(lines) + 1))[:args.lines])
+
+    blocks = list(processor.iter_blocks(text))
+    mismatches = sum(1 for a, b in zip(blocks, iter_blocks_regex(text)) if a != b)
+    dispatch_time = best_time(lambda: list(processor.iter_blocks(text)), args.repeat)
+    regex_time = best_time(lambda: list(iter_blocks_regex(text)), args.repeat)
+    # Work both parsers share: splitting the lines and creating one block per result
+    shared_time = best_time(lambda: (list(processor.iter_lines(text)),
+                                     [ContentBlock(b.type, b.content, b.original) for b in blocks]), args.repeat)
+
+    print(f"Input: {args.lines} lines, {len(text) / 1e6:.1f}M characters, {len(blocks)} blocks")
+    print(f"Dispatch: {dispatch_time:.3f}s ({args.lines / dispatch_time / 1e6:.2f}M lines/s)")
+    print(f"Regex:    {regex_time:.3f}s ({args.lines / regex_time / 1e6:.2f}M lines/s)")
+    print(f"Speedup: {regex_time / dispatch_time:.1f}x overall, "
+          f"{(regex_time - shared_time) / max(dispatch_time - shared_time, 1e-9):.1f}x excluding "
+          f"{shared_time:.3f}s of line splitting and block creation; mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
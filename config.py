@@ -14,6 +14,12 @@ class Config:
     API_KEY = os.getenv("LLM_API_KEY")
     BASE_URL = os.getenv("LLM_BASE_URL")
     MODEL_NAME = os.getenv("LLM_MODEL")
+    # Optional pool of endpoints (JSON list, see CONFIG.md); the settings above remain the
+    # primary endpoint and the defaults for entries that omit a key or model
+    ENDPOINTS_FILE = os.getenv("LLM_ENDPOINTS_FILE")
+    ENDPOINT_FAILURE_THRESHOLD = int(os.getenv("ENDPOINT_FAILURE_THRESHOLD", "3"))
+    ENDPOINT_EJECT_SECONDS = float(os.getenv("ENDPOINT_EJECT_SECONDS", "30"))
+    HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))
     
     # Validate required environment variables
     if not API_KEY:
@@ -27,6 +33,75 @@ class Config:
     MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "5"))
     TIMEOUT_SECONDS = int(os.getenv("TIMEOUT_SECONDS", "120"))
     RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+    # Exponential backoff with full jitter between attempts, optionally capped per error class
+    # (throttled, server_error, timeout, network), e.g. "timeout=1,server_error=2"
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+    RETRY_BUDGETS = os.getenv("RETRY_BUDGETS", "")
+    # Circuit breaker: pause all requests after this many consecutive failures while every endpoint is failing,
+    # probe again after the recovery time
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+    # Streaming (SSE): detect stalled generations after FIRST_TOKEN_TIMEOUT / INTER_TOKEN_TIMEOUT
+    # seconds instead of waiting TIMEOUT_SECONDS for the whole body
+    STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() in ("1", "true", "yes")
+    FIRST_TOKEN_TIMEOUT = float(os.getenv("FIRST_TOKEN_TIMEOUT", "20"))
+    INTER_TOKEN_TIMEOUT = float(os.getenv("INTER_TOKEN_TIMEOUT", "10"))
+    # Hedging: duplicate requests still running after the observed p95 latency, for at most
+    # HEDGE_MAX_FRACTION of all requests (and never before HEDGE_MIN_DELAY seconds)
+    HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+    HEDGE_MAX_FRACTION = float(os.getenv("HEDGE_MAX_FRACTION", "0.05"))
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "5"))
+    # 'fixed': always MAX_CONCURRENCY requests in flight
+    # 'adaptive': start at MAX_CONCURRENCY, grow/shrink (AIMD) on throttling, errors and latency
+    CONCURRENCY_MODE = os.getenv("CONCURRENCY_MODE", "fixed").lower()
+    ADAPTIVE_MIN_CONCURRENCY = int(os.getenv("ADAPTIVE_MIN_CONCURRENCY", "1"))
+    ADAPTIVE_MAX_CONCURRENCY = int(os.getenv("ADAPTIVE_MAX_CONCURRENCY", "32"))
+    # Client-side provider quotas: requests and estimated tokens per minute (0 disables)
+    RATE_LIMIT_RPM = float(os.getenv("RATE_LIMIT_RPM", "0"))
+    RATE_LIMIT_TPM = float(os.getenv("RATE_LIMIT_TPM", "0"))
+    # Optional prices in USD per million tokens for the cost report, per model:
+    # "model=prompt/completion[/cached prompt]", comma-separated
+    TOKEN_PRICES = os.getenv("TOKEN_PRICES", "")
+    # Stop Step 5 cleanly before a run's prompt + completion tokens could exceed this (0 disables)
+    TOKEN_BUDGET = int(os.getenv("TOKEN_BUDGET", "0"))
+    # Latency model for --estimate: fixed overhead per request plus completion tokens at this speed
+    ESTIMATE_REQUEST_SECONDS = float(os.getenv("ESTIMATE_REQUEST_SECONDS", "2"))
+    ESTIMATE_TOKENS_PER_SECOND = float(os.getenv("ESTIMATE_TOKENS_PER_SECOND", "50"))
+    
+    # Cache Settings
+    CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+    # Translation memory: reuse earlier translations of identical blocks (opt-in)
+    TM_ENABLED = os.getenv("TM_ENABLED", "false").lower() in ("1", "true", "yes")
+    TM_PATH = os.getenv("TM_PATH", str(Path(CACHE_DIR) / "translation_memory.sqlite"))
+    TM_MAX_SIZE_MB = float(os.getenv("TM_MAX_SIZE_MB", "200"))
+    
+    # Text blocks passed through untranslated (Step 4), any of: html, page_number, cjk, numeric,
+    # reference ('none' translates everything)
+    SKIP_CATEGORIES = os.getenv("SKIP_CATEGORIES", "html,page_number,cjk,numeric,reference")
+    
+    # Re-chunking (Step 4): merge adjacent text blocks up to CHUNK_TARGET_TOKENS and split blocks
+    # over CHUNK_MAX_TOKENS on sentence boundaries (estimated tokens, 0 disables either)
+    CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "0"))
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "1500"))
+    
+    # Replace inline math, code spans, link targets, URLs, image refs, footnote markers and
+    # inline HTML with {{n}} placeholders before translation, restoring them afterwards
+    MASK_SPANS = os.getenv("MASK_SPANS", "true").lower() in ("1", "true", "yes")
+    
+    # Dispatch order of translation requests: 'longest_first' (default), 'document' or 'shortest_first'
+    SCHEDULE = os.getenv("SCHEDULE", "longest_first").lower()
+    
+    # Request packing: send consecutive small blocks together in one request
+    # (0 disables packing; budget is the estimated source tokens per request)
+    PACK_MAX_TOKENS = int(os.getenv("PACK_MAX_TOKENS", "0"))
+    PACK_MAX_BLOCKS = int(os.getenv("PACK_MAX_BLOCKS", "20"))
+    
+    # Where the per-block glossary goes:
+    # 'system': appended to the system prompt (default)
+    # 'prefix_cache': at the top of the user message, so every request shares one static
+    #                 system prompt that providers' automatic prompt caching can reuse
+    PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "system").lower()
     
     # Output Settings
     OUTPUT_DIR = "output"
@@ -103,7 +178,7 @@ Rules:
         'read_markdown': True,           # Step 2: Read Markdown file
         'parse_markdown': True,          # Step 3: Parse & chunk Markdown
         'identify_text_blocks': True,    # Step 4: Identify text blocks to translate
-        'load_glossary': True,           # Step 4.1: Load glossary
+        'load_glossary': True,           # Step 4.1: Load glossary & pre-scan text blocks for terms
         'translate': True,               # Step 5: Translate text blocks
         'merge_translations': True,      # Step 6: Merge translations back
         'reconstruct_markdown': True,    # Step 7: Reconstruct bilingual Markdown
@@ -151,21 +226,44 @@ Rules:
             "Content-Type": "application/json"
         }
 
+    # Appended to the system prompt for packed requests
+    PACK_INSTRUCTION = """The text below consists of several independent segments.
+Each segment starts with a marker line of the form <<<SEGMENT n>>>.
+Translate every segment separately. Copy each marker line unchanged, in the same order, before its translation.
+Do not merge, split, drop or add segments."""
+
+    # Appended to the system prompt when the text contains masked spans
+    MASK_INSTRUCTION = """Placeholders of the form {{n}} stand for formulas, code, links and markup.
+Copy every placeholder unchanged, exactly once, at the matching position in the translation."""
+
     @staticmethod
-    def get_payload(text, specific_glossary=None):
+    def get_payload(text, specific_glossary=None, packed=False, masked=False):
         system_prompt = Config.SYSTEM_PROMPT
-        if specific_glossary:
-            system_prompt += f"\n\nUse the following specific glossary for this section:\n{specific_glossary}"
+        user_content = f"Original Text:\n{text}\n\nTranslation:"
+        glossary_section = f"Use the following specific glossary for this section:\n{specific_glossary}" if specific_glossary else None
+        if glossary_section and Config.PROMPT_LAYOUT == 'prefix_cache':
+            # Keep the system message byte-identical across requests so the provider can cache it
+            user_content = f"{glossary_section}\n\n{user_content}"
+        elif glossary_section:
+            system_prompt += f"\n\n{glossary_section}"
+        if packed:
+            system_prompt += f"\n\n{Config.PACK_INSTRUCTION}"
+        if masked:
+            system_prompt += f"\n\n{Config.MASK_INSTRUCTION}"
             
-        return {
+        payload = {
             "model": Config.MODEL_NAME,
             "messages": [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Original Text:\n{text}\n\nTranslation:"}
+                {"role": "user", "content": user_content}
             ],
-            "stream": False,
+            "stream": Config.STREAM_RESPONSES,
             "temperature": 0.1
         }
+        if Config.STREAM_RESPONSES:
+            # Ask for a final usage chunk so token accounting still works
+            payload["stream_options"] = {"include_usage": True}
+        return payload
     
     @staticmethod
     def apply_preset(preset_name):
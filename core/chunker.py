@@ -0,0 +1,148 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from core.tokens import CJK_CHARACTERS, CJK_IDEOGRAPHS, estimate_tokens
+
+@dataclass
+class Chunk:
+    text: str
+    blocks: List[int]  # Indices (among the text blocks) of the blocks this chunk covers
+    part: int = None   # Position of this piece when one oversize block was split, else None
+    separator: str = None  # Whitespace that followed a split piece in the source block ('' before CJK text)
+
+# Sentence ends: terminal punctuation (plus closing quotes/brackets), then whitespace and
+# something that can start a sentence; CJK full stops need no whitespace after them
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\'\u201d\u2019)\]]*\s+(?=["\'\u201c\u2018(\[]?[A-Z0-9' + CJK_IDEOGRAPHS + '])'
+                           r'|(?<=[\u3002\uff01\uff1f])[\u201d\u2019\u300d\u300f\uff09]*\s*(?=\S)')
+# Common abbreviations that end in a period without ending the sentence
+_ABBREVIATION = re.compile(r'\b(?:e\.g|i\.e|etc|cf|vs|al|Fig|Figs|Eq|Eqs|Ref|Refs|No|Vol|pp|Dr|Mr|Mrs|Ms|St|approx)\.$',
+                           re.IGNORECASE)
+_CJK_END = re.compile(f'[{CJK_CHARACTERS}]$')
+
+def _sentences_with_separators(text: str) -> List[Tuple[str, str]]:
+    """(sentence, whitespace that followed it) pairs; the text is their concatenation, minus outer whitespace."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if _ABBREVIATION.search(text[start:match.start()]):
+            continue
+        closing = match.group().rstrip()
+        sentences.append((text[start:match.start()] + closing, match.group()[len(closing):]))
+        start = match.end()
+    sentences.append((text[start:], ''))
+    return [(sentence.strip(), separator) for sentence, separator in sentences if sentence.strip()]
+
+def split_sentences(text: str) -> List[str]:
+    """Split text after sentence-ending punctuation, keeping abbreviations attached."""
+    return [sentence for sentence, _ in _sentences_with_separators(text)]
+
+def _split_with_separators(text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """`split_block` pieces, each with the whitespace that followed it in `text`."""
+    pieces = []
+    current = ''
+    current_tokens = 0
+    separator = ''
+    for sentence, following in _sentences_with_separators(text):
+        tokens = estimate_tokens(sentence)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append((current, separator))
+            current = ''
+            current_tokens = 0
+        elif current:
+            # Sentences keep the whitespace between them, line breaks included
+            current += separator
+        current += sentence
+        current_tokens += tokens
+        separator = following
+    if current:
+        pieces.append((current, ''))
+    return pieces
+
+def split_block(text: str, max_tokens: int) -> List[str]:
+    """
+    Split an oversize block into pieces of at most `max_tokens` estimated tokens,
+    on sentence boundaries. A single sentence over the limit becomes its own piece.
+    Line breaks inside a piece are kept.
+    """
+    return [piece for piece, _ in _split_with_separators(text, max_tokens)]
+
+def rechunk(blocks: List, target_tokens: int = 0, max_tokens: int = 0) -> List[Chunk]:
+    """
+    Turn the text blocks of a parsed document into translation chunks.
+
+    Adjacent text blocks (separated only by blank lines) are merged while the
+    chunk stays within `target_tokens`; blocks over `max_tokens` are split on
+    sentence boundaries. 0 disables either. Every text block is covered by
+    exactly one merged chunk or by its consecutive split pieces, in order.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    text_index = -1
+    # Position in `blocks` -> index among the text blocks
+    block_indices = {}
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append(Chunk('\n\n'.join(blocks[i].content for i in current),
+                                [block_indices[i] for i in current]))
+        current = []
+        current_tokens = 0
+
+    for position, block in enumerate(blocks):
+        if block.type == 'separator':
+            continue
+        if block.type != 'text':
+            # Headers, images, code and untranslated blocks end a run of mergeable text
+            flush()
+            continue
+        text_index += 1
+        block_indices[position] = text_index
+        tokens = estimate_tokens(block.content)
+        if max_tokens and tokens > max_tokens:
+            flush()
+            pieces = _split_with_separators(block.content, max_tokens)
+            if len(pieces) > 1:
+                chunks.extend(Chunk(piece, [text_index], part, separator)
+                              for part, (piece, separator) in enumerate(pieces))
+                continue
+        if current and (not target_tokens or current_tokens + tokens > target_tokens):
+            flush()
+        current.append(position)
+        current_tokens += tokens
+    flush()
+    return chunks
+
+def join_pieces(translations: List[str], separators: List[Optional[str]] = None) -> str:
+    """
+    Join the translations of a split block. Where the source piece was followed by
+    line breaks (`separators`), so is its translation; otherwise a space goes only
+    between non-CJK text.
+    """
+    joined = ''
+    for n, translation in enumerate(translations):
+        separator = separators[n - 1] if separators and n else None
+        if joined and separator and '\n' in separator:
+            joined += '\n' * separator.count('\n')
+        elif joined and not (_CJK_END.search(joined) or _CJK_END.search(translation[:1])):
+            joined += ' '
+        joined += translation
+    return joined
+
+def fold_translations(chunks: List[Chunk], translations: List[str], block_count: int) -> List[Optional[str]]:
+    """
+    Map chunk translations back to text blocks. A merged chunk's translation goes
+    to its last block (so it follows all of the originals it covers), the others
+    get None; a split block gets its pieces' translations joined.
+    """
+    block_translations = [None] * block_count
+    pieces = {}
+    for chunk, translation in zip(chunks, translations):
+        if chunk.part is None:
+            block_translations[chunk.blocks[-1]] = translation
+        else:
+            pieces.setdefault(chunk.blocks[0], []).append((translation, chunk.separator))
+    for index, parts in pieces.items():
+        block_translations[index] = join_pieces([part for part, _ in parts], [separator for _, separator in parts])
+    return block_translations
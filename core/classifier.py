@@ -0,0 +1,119 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from core.tokens import CJK_IDEOGRAPH
+
+# Categories of text blocks that are passed through untranslated, in the order they are tested
+CATEGORIES = ('html', 'page_number', 'cjk', 'numeric', 'reference')
+
+# HTML dumps of tables as produced by magic-pdf
+_HTML_START = re.compile(r'<(?:html|body|table|thead|tbody|tr)\b', re.IGNORECASE)
+_DASHES = r'[-\u2013\u2014\s]*'
+# Canonical roman numerals up to 399, in one case only, so words like "Mild" or "mix" don't count
+_ROMAN_LOWER = r'(?=[ivxlc])c{0,3}(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})'
+_ROMAN_UPPER = _ROMAN_LOWER.upper()
+# Arabic or lowercase roman page numbers; uppercase roman ones only after "Page" or between dashes,
+# since a bare "I" or "X" is more likely a word or a label
+_PAGE_NUMBER = re.compile(
+    rf'^{_DASHES}(?:(?:(?i:page)\s+)?(?:\d{{1,4}}(?:\s*/\s*\d{{1,4}})?|{_ROMAN_LOWER})'
+    rf'|(?i:page)\s+{_ROMAN_UPPER}'
+    rf'|[-\u2013\u2014]\s*{_ROMAN_UPPER}\s*[-\u2013\u2014]){_DASHES}$'
+)
+_LETTER = re.compile(r'[A-Za-z]')
+_DIGIT = re.compile(r'\d')
+_WORD = re.compile(r'\b[A-Za-z]{3,}\b')
+_YEAR = re.compile(r'\b(?:1[89]|20)\d{2}[a-z]?\b')
+# Markers that only bibliography entries carry; "et al." and times like 21:30 turn up in prose too
+_CITATION_MARKER = re.compile(r'\bdoi\b|arxiv|\bpp?\.\s*\d|\bvol\.|\d+\s*\(\d+\)\s*[:,]', re.IGNORECASE)
+_AUTHOR_START = re.compile(r'^\s*(?:\[\d+\]|\d+\.)?\s*[A-Z][A-Za-z\'\-]+,\s*(?:[A-Z]\.\s*)+')
+
+# Share of CJK ideographs among ideographs and Latin letters above which a
+# block is taken to be Chinese already
+CJK_MIN_RATIO = 0.3
+# Digits as a share of non-space characters, and words (3+ letters) as a share of
+# whitespace-separated tokens, for a block to count as catalog data
+NUMERIC_MIN_DIGIT_RATIO = 0.3
+NUMERIC_MAX_WORD_RATIO = 0.3
+# Share of lines that must look like bibliography entries
+REFERENCE_MIN_LINE_RATIO = 0.5
+
+def parse_categories(spec: str) -> List[str]:
+    """Parse "html,numeric" into a list of skip categories ('' or 'none' disables skipping)."""
+    categories = [item.strip().lower() for item in (spec or '').split(',') if item.strip()]
+    if categories == ['none']:
+        return []
+    unknown = [category for category in categories if category not in CATEGORIES]
+    if unknown:
+        raise ValueError(f"Unknown skip categories: {unknown}. Available: {list(CATEGORIES)}")
+    return categories
+
+def _is_citation(line: str, entry_only: bool = False) -> bool:
+    """A line with a year that starts like an entry ("Hubble, E. P."), or carries a citation marker unless `entry_only`."""
+    if not _YEAR.search(line):
+        return False
+    if _AUTHOR_START.match(line):
+        return True
+    return not entry_only and bool(_CITATION_MARKER.search(line))
+
+def classify_block(text: str, categories: Iterable[str] = CATEGORIES) -> Optional[str]:
+    """
+    Return the category of a text block that should not be sent for translation
+    ('html', 'page_number', 'cjk', 'numeric', 'reference'), or None to translate it.
+    Only the given categories are tested.
+    """
+    stripped = text.strip()
+    if not stripped:
+        return None
+    categories = set(categories)
+
+    if 'html' in categories and stripped.startswith('<') and _HTML_START.match(stripped):
+        return 'html'
+    if 'page_number' in categories and _PAGE_NUMBER.match(stripped):
+        return 'page_number'
+
+    letters = len(_LETTER.findall(stripped))
+    if 'cjk' in categories:
+        cjk = len(CJK_IDEOGRAPH.findall(stripped))
+        if cjk and cjk / (cjk + letters) >= CJK_MIN_RATIO:
+            return 'cjk'
+
+    if 'numeric' in categories:
+        tokens = stripped.split()
+        non_space = sum(len(token) for token in tokens)
+        digits = len(_DIGIT.findall(stripped))
+        words = len(_WORD.findall(stripped))
+        if not letters and not CJK_IDEOGRAPH.search(stripped):
+            # Only digits, punctuation and symbols
+            return 'numeric'
+        if digits / non_space >= NUMERIC_MIN_DIGIT_RATIO and words / len(tokens) <= NUMERIC_MAX_WORD_RATIO:
+            return 'numeric'
+
+    if 'reference' in categories:
+        lines = [line for line in stripped.split('\n') if line.strip()]
+        # A magic-pdf paragraph is a single line, so on its own it must be shaped like an entry
+        entry_only = len(lines) == 1
+        citations = sum(1 for line in lines if _is_citation(line, entry_only))
+        if citations / len(lines) >= REFERENCE_MIN_LINE_RATIO:
+            return 'reference'
+    return None
+
+def mark_passthrough(blocks: List, categories: Iterable[str]) -> Dict[str, int]:
+    """
+    Retype text blocks that should not be translated as 'passthrough' (the category
+    goes to metadata['skip']); passthrough blocks from an earlier run are
+    re-classified. Returns the number of skipped blocks per category.
+    """
+    categories = list(categories)
+    counts = Counter()
+    for block in blocks:
+        if block.type == 'passthrough':
+            block.type = 'text'
+            block.metadata = {key: value for key, value in (block.metadata or {}).items() if key != 'skip'} or None
+        if block.type != 'text':
+            continue
+        category = classify_block(block.content, categories) if categories else None
+        if category:
+            block.type = 'passthrough'
+            block.metadata = dict(block.metadata or {}, skip=category)
+            counts[category] += 1
+    return dict(counts)
@@ -0,0 +1,136 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+from tqdm import tqdm
+from config import Config
+from core.memory import normalize_whitespace
+from core.scheduler import WorkQueue, group_priority
+from core.tokens import estimate_tokens
+from core.translator import Translator
+
+def dedupe(texts: List[str]) -> Tuple[List[int], List[int]]:
+    """
+    Collapse identical (whitespace-normalized) texts, the same normalization the
+    translation memory keys on.
+    Returns the index of the first occurrence of each distinct text, and for
+    every position the request number (index into that list) that covers it.
+    """
+    first_index = {}
+    unique = []
+    owners = []
+    for i, text in enumerate(texts):
+        key = normalize_whitespace(text)
+        if key not in first_index:
+            first_index[key] = len(unique)
+            unique.append(i)
+        owners.append(first_index[key])
+    return unique, owners
+
+def pack(indices: List[int], texts: List[str], max_tokens: int, max_blocks: int) -> List[List[int]]:
+    """
+    Group consecutive blocks into requests of at most `max_tokens` estimated
+    source tokens and `max_blocks` blocks. A block over budget goes alone.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for i in indices:
+        tokens = estimate_tokens(texts[i])
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_blocks):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+async def _translate_group(translator: Translator, texts: List[str], block_terms: List[List[int]],
+                           group: List[int], stats: Dict[str, Any]) -> List[str]:
+    if len(group) == 1:
+        i = group[0]
+        return [await translator.translate(texts[i], term_ids=block_terms[i])]
+
+    results = await translator.translate_packed([texts[i] for i in group], [block_terms[i] for i in group])
+    if results is None:
+        stats['pack_fallbacks'] += 1
+        tasks = [asyncio.create_task(translator.translate(texts[i], term_ids=block_terms[i])) for i in group]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # A budget stop or cancellation must not leave the siblings spending tokens
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    return list(results)
+
+async def translate_blocks(translator: Translator, texts: List[str], block_terms: List[List[int]] = None,
+                           done: Dict[int, str] = None,
+                           on_result: Callable[[int, str], None] = None,
+                           priority: Callable[[List[int]], float] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Translate text blocks, sending each distinct block only once and
+    fanning the result back out to every position it occurs at.
+    With PACK_MAX_TOKENS set, consecutive distinct blocks are packed into
+    shared requests.
+    `done` holds translations already available by position (e.g. from a
+    resumed journal); those blocks are not sent again. `on_result(index, translation)`
+    is called for every position as soon as its translation lands.
+    Requests are dispatched in order of `priority(group)` (lowest first), by default
+    following Config.SCHEDULE; results are still returned in input order.
+    Returns the translations in input order and dispatch statistics.
+    """
+    if block_terms is None:
+        block_terms = [None] * len(texts)
+    done = dict(done or {})
+
+    pending = [i for i in range(len(texts)) if i not in done]
+    unique, owners = dedupe([texts[i] for i in pending])
+    unique = [pending[u] for u in unique]
+    followers = defaultdict(list)
+    for position, owner in zip(pending, owners):
+        followers[unique[owner]].append(position)
+
+    if Config.PACK_MAX_TOKENS > 0:
+        groups = pack(unique, texts, Config.PACK_MAX_TOKENS, Config.PACK_MAX_BLOCKS)
+    else:
+        groups = [[i] for i in unique]
+
+    stats = {
+        'blocks': len(texts),
+        'resumed': len(texts) - len(pending),
+        # HTTP requests the translator actually sent (set at the end)
+        'requests': 0,
+        'deduplicated': len(pending) - len(unique),
+        'packed_requests': sum(1 for group in groups if len(group) > 1),
+        'pack_fallbacks': 0,
+        'schedule': Config.SCHEDULE if priority is None else 'custom'
+    }
+
+    requests_before = translator.requests_sent
+    queue = WorkQueue(translator.max_concurrency)
+    priority = priority or group_priority(Config.SCHEDULE, texts)
+    for group in groups:
+        queue.put(group, priority(group))
+
+    with tqdm(total=len(unique), desc="Translating", unit="block") as progress:
+        async def run(group):
+            translations = await _translate_group(translator, texts, block_terms, group, stats)
+            for i, translation in zip(group, translations):
+                for position in followers[i]:
+                    done[position] = translation
+                    if on_result:
+                        on_result(position, translation)
+            progress.update(len(group))
+            if Config.CONCURRENCY_MODE == 'adaptive':
+                progress.set_postfix(limit=translator.concurrency_limit, refresh=False)
+
+        try:
+            await queue.run(run)
+        finally:
+            stats['requests'] = translator.requests_sent - requests_before
+
+    translations = [done[i] for i in range(len(texts))]
+    return translations, stats
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import Config
+from core.limiter import AdaptiveLimiter
+from core.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+class Endpoint:
+    """One OpenAI-compatible backend: base URL, key and model, with its own quota and stats."""
+
+    def __init__(self, base_url: str, api_key: str, model: str, name: str = None, weight: float = 1.0,
+                 max_concurrency: int = None, rpm: float = None, tpm: float = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.name = name or self.base_url
+        self.weight = max(float(weight), 0.01)
+        self.max_concurrency = max_concurrency
+        # Keys and gateways each have their own quotas
+        self.rate_limiter = RateLimiter(
+            Config.RATE_LIMIT_RPM if rpm is None else rpm,
+            Config.RATE_LIMIT_TPM if tpm is None else tpm
+        )
+
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.counts = {AdaptiveLimiter.OK: 0, AdaptiveLimiter.THROTTLED: 0, AdaptiveLimiter.ERROR: 0}
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def is_ejected(self, now: float = None) -> bool:
+        return (now or time.monotonic()) < self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': sum(self.counts.values()),
+            'outcomes': dict(self.counts),
+            'ejections': self.ejections,
+            'rate_limit_wait_seconds': round(self.rate_limiter.waited, 2)
+        }
+
+class EndpointPool:
+    """
+    Routes requests across several endpoints.
+
+    Each request goes to the available endpoint with the fewest outstanding
+    requests relative to its weight, never exceeding an endpoint's
+    max_concurrency, and avoiding endpoints whose rate limiter is paused. An endpoint that fails `failure_threshold` times in a row
+    (429, 5xx, timeouts) is ejected for `eject_seconds`, doubling on each
+    repeated ejection, unless it is the last healthy one. Health checks probe
+    ejected endpoints and bring them back early once they answer again.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], failure_threshold: int = 3, eject_seconds: float = 30.0,
+                 max_eject_seconds: float = 300.0):
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._changed = asyncio.Event()
+        self._health_task = None
+
+    @classmethod
+    def from_config(cls) -> 'EndpointPool':
+        """
+        Endpoints listed in LLM_ENDPOINTS_FILE (a JSON list of objects with base_url,
+        api_key, model and optional name, weight, max_concurrency, rpm, tpm), or the
+        single LLM_BASE_URL / LLM_API_KEY / LLM_MODEL endpoint.
+        """
+        if Config.ENDPOINTS_FILE:
+            with open(Path(Config.ENDPOINTS_FILE), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            endpoints = [Endpoint(
+                base_url=entry['base_url'],
+                api_key=entry.get('api_key', Config.API_KEY),
+                model=entry.get('model', Config.MODEL_NAME),
+                name=entry.get('name'),
+                weight=entry.get('weight', 1.0),
+                max_concurrency=entry.get('max_concurrency'),
+                rpm=entry.get('rpm'),
+                tpm=entry.get('tpm')
+            ) for entry in entries]
+        else:
+            endpoints = [Endpoint(Config.BASE_URL, Config.API_KEY, Config.MODEL_NAME)]
+        return cls(endpoints, Config.ENDPOINT_FAILURE_THRESHOLD, Config.ENDPOINT_EJECT_SECONDS)
+
+    def _pick(self) -> Optional[Endpoint]:
+        now = time.monotonic()
+        candidates = [
+            e for e in self.endpoints
+            if not e.is_ejected(now) and (not e.max_concurrency or e.outstanding < e.max_concurrency)
+        ]
+        if not candidates:
+            return None
+        # Skip endpoints paused by a 429 while another one can take the request
+        unpaused = [e for e in candidates if not e.rate_limiter.is_paused()]
+        return min(unpaused or candidates, key=lambda e: (e.outstanding + 1) / e.weight)
+
+    async def acquire(self) -> Endpoint:
+        """Wait for an endpoint with spare capacity and reserve a slot on it."""
+        while True:
+            endpoint = self._pick()
+            if endpoint:
+                endpoint.outstanding += 1
+                return endpoint
+            # Everything is busy or ejected: wait for a release or the next reinstatement
+            now = time.monotonic()
+            ejected = [e.ejected_until - now for e in self.endpoints if e.is_ejected(now)]
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), min(ejected) if ejected else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, endpoint: Endpoint):
+        endpoint.outstanding -= 1
+        self._changed.set()
+
+    def report(self, endpoint: Endpoint, outcome: str):
+        """Feed back the outcome of one request attempt on `endpoint`."""
+        endpoint.counts[outcome] = endpoint.counts.get(outcome, 0) + 1
+        if outcome == AdaptiveLimiter.OK:
+            endpoint.consecutive_failures = 0
+            return
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures < self.failure_threshold:
+            return
+        now = time.monotonic()
+        others_healthy = any(not e.is_ejected(now) for e in self.endpoints if e is not endpoint)
+        if others_healthy and not endpoint.is_ejected(now):
+            duration = min(self.max_eject_seconds, self.eject_seconds * 2 ** endpoint.ejections)
+            endpoint.ejected_until = now + duration
+            endpoint.ejections += 1
+            endpoint.consecutive_failures = 0
+            logger.warning(f"Ejecting endpoint {endpoint.name} for {duration:.0f}s after repeated failures")
+
+    def pause_remaining(self) -> float:
+        """Seconds until some endpoint that is not ejected comes out of its rate-limit pause (0 if one is free)."""
+        now = time.monotonic()
+        waits = [e.rate_limiter.pause_remaining() for e in self.endpoints if not e.is_ejected(now)]
+        return min(waits) if waits else 0.0
+
+    def all_failing(self) -> bool:
+        """Whether every endpoint is ejected or failed its latest request."""
+        now = time.monotonic()
+        return all(e.is_ejected(now) or e.consecutive_failures for e in self.endpoints)
+
+    def reinstate(self, endpoint: Endpoint):
+        endpoint.ejected_until = 0.0
+        endpoint.consecutive_failures = 0
+        self._changed.set()
+
+    async def check_health(self, session, endpoint: Endpoint) -> bool:
+        """Probe GET {base_url}/models; any answer other than 429/5xx counts as healthy."""
+        try:
+            async with session.get(f"{endpoint.base_url}/models", headers=endpoint.headers, timeout=10) as response:
+                return response.status != 429 and response.status < 500
+        except Exception:
+            return False
+
+    def start_health_checks(self, session, interval: float):
+        """Periodically probe ejected endpoints (only useful with more than one endpoint)."""
+        if len(self.endpoints) > 1 and interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(session, interval))
+
+    async def _health_loop(self, session, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            for endpoint in self.endpoints:
+                if endpoint.is_ejected() and await self.check_health(session, endpoint):
+                    logger.info(f"Endpoint {endpoint.name} is healthy again, reinstating")
+                    self.reinstate(endpoint)
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    @property
+    def rate_limit_wait(self) -> float:
+        """Total seconds requests spent waiting on rate limiters."""
+        return sum(e.rate_limiter.waited for e in self.endpoints)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {e.name: e.stats() for e in self.endpoints}
@@ -0,0 +1,102 @@
+import heapq
+from typing import Any, Dict, List
+from config import Config
+from core.dispatch import dedupe, pack
+from core.glossary import GlossaryLoader
+from core.masking import mask_spans
+from core.scheduler import group_priority
+from core.tokens import estimate_tokens
+from core.translator import Translator, glossary_section, pack_segments, packed_glossary_section
+from core.usage import UsageTracker, parse_prices
+
+def estimate_translation(texts: List[str], glossary: GlossaryLoader = None,
+                         block_terms: List[List[int]] = None) -> Dict[str, Any]:
+    """
+    Offline pre-flight estimate of Step 5: the requests the dispatcher would send
+    (after deduplication and packing) and their prompt tokens, built with the same
+    prompts and glossary injection, plus the expected completion tokens, cost and
+    wall time at the configured concurrency and rate limits.
+
+    Wall time simulates the schedule on MAX_CONCURRENCY workers, with each request
+    taking ESTIMATE_REQUEST_SECONDS plus its completion at ESTIMATE_TOKENS_PER_SECOND.
+    The translation memory is not consulted, so the estimate is for a cold cache.
+    """
+    if block_terms is None or len(block_terms) != len(texts):
+        block_terms = [None] * len(texts)
+
+    unique, _ = dedupe(texts)
+    if Config.PACK_MAX_TOKENS > 0:
+        groups = pack(unique, texts, Config.PACK_MAX_TOKENS, Config.PACK_MAX_BLOCKS)
+    else:
+        groups = [[i] for i in unique]
+    groups = [group for group in groups if any(texts[i].strip() for i in group)]
+
+    counts = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+    glossary_tokens = 0
+    durations = {}
+    for group in groups:
+        group_texts = [texts[i] for i in group]
+        # Masked spans come back as placeholders too, so they count on both sides
+        masked_texts = [mask_spans(text)[0] if Config.MASK_SPANS else text for text in group_texts]
+        masked = masked_texts != group_texts
+        if len(group) == 1:
+            section = glossary_section(glossary, group_texts[0], block_terms[group[0]]) if glossary else None
+            payload = Config.get_payload(masked_texts[0], section, masked=masked)
+        else:
+            section = packed_glossary_section(glossary, group_texts, [block_terms[i] for i in group]) if glossary else None
+            payload = Config.get_payload(pack_segments(masked_texts), section, packed=True, masked=masked)
+        completion = int(sum(estimate_tokens(text) for text in masked_texts) * Translator.COMPLETION_TOKEN_RATIO)
+        counts['requests'] += 1
+        counts['prompt_tokens'] += sum(estimate_tokens(message['content']) for message in payload['messages'])
+        counts['completion_tokens'] += completion
+        glossary_tokens += estimate_tokens(section) if section else 0
+        durations[group[0]] = Config.ESTIMATE_REQUEST_SECONDS + completion / Config.ESTIMATE_TOKENS_PER_SECOND
+
+    # List-schedule the requests in dispatch order onto the workers
+    priority = group_priority(Config.SCHEDULE, texts)
+    workers = [0.0] * max(1, min(Config.MAX_CONCURRENCY, len(groups)))
+    for group in sorted(groups, key=priority):
+        heapq.heappush(workers, heapq.heappop(workers) + durations[group[0]])
+    wall_seconds = max(workers)
+    # Client-side quotas put a floor under the wall time
+    total_tokens = counts['prompt_tokens'] + counts['completion_tokens']
+    if Config.RATE_LIMIT_RPM > 0:
+        wall_seconds = max(wall_seconds, 60 * counts['requests'] / Config.RATE_LIMIT_RPM)
+    if Config.RATE_LIMIT_TPM > 0:
+        wall_seconds = max(wall_seconds, 60 * total_tokens / Config.RATE_LIMIT_TPM)
+
+    estimate = {
+        'blocks': len(texts),
+        'requests': counts['requests'],
+        'prompt_tokens': counts['prompt_tokens'],
+        'glossary_tokens': glossary_tokens,
+        'completion_tokens': counts['completion_tokens'],
+        'total_tokens': total_tokens,
+        'concurrency': Config.MAX_CONCURRENCY,
+        'wall_seconds': round(wall_seconds, 1)
+    }
+    cost = UsageTracker(parse_prices(Config.TOKEN_PRICES)).cost(Config.MODEL_NAME, counts)
+    if cost is not None:
+        estimate['cost_usd'] = round(cost, 4)
+    return estimate
+
+def add_estimates(total: Dict[str, Any], estimate: Dict[str, Any]) -> Dict[str, Any]:
+    """Sum per-file estimates (batch totals; files run one after another, so wall times add up)."""
+    if not total:
+        return dict(estimate)
+    return {key: round(total.get(key, 0) + value, 4) if key != 'concurrency' else value
+            for key, value in estimate.items()}
+
+def format_estimate(estimate: Dict[str, Any]) -> List[str]:
+    """Human-readable lines for an estimate (used by main.py and batch_runner.py)."""
+    minutes, seconds = divmod(int(estimate['wall_seconds']), 60)
+    hours, minutes = divmod(minutes, 60)
+    lines = [
+        f"{estimate['requests']} requests for {estimate['blocks']} text blocks",
+        f"~{estimate['prompt_tokens']} prompt tokens (~{estimate['glossary_tokens']} glossary) "
+        f"+ ~{estimate['completion_tokens']} completion tokens = ~{estimate['total_tokens']} tokens",
+        f"~{hours}h{minutes:02d}m{seconds:02d}s at concurrency {estimate['concurrency']}"
+    ]
+    if 'cost_usd' in estimate:
+        lines.append(f"~${estimate['cost_usd']:.4f} for {Config.MODEL_NAME}")
+    return lines
@@ -1,19 +1,248 @@
+import hashlib
+import marshal
+import os
 import re
+from array import array
+from collections import Counter
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Set, Tuple
+
+# Bump when the on-disk index layout changes
+INDEX_FORMAT_VERSION = 1
+
+
+def _is_word_char(ch: str) -> bool:
+    """Same definition of a word character as the `\\w` regex class."""
+    return ch.isalnum() or ch == '_'
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton over lower-cased glossary variants.
+
+    Built once at load time; `find` scans the text in a single pass and
+    reports every pattern id whose match is delimited by word boundaries,
+    with the same semantics as `re.search(r'\\b' + re.escape(p) + r'\\b')`.
+
+    The automaton is stored as a double-array trie (flat `array`s plus a
+    small alphabet map), so it can be dumped to and restored from raw bytes
+    without rebuilding any per-node Python objects.
+    """
+
+    def __init__(self):
+        # Build-time trie: list of {char: child} dicts plus terminal pattern ids
+        self._trie: List[Dict[str, int]] = [{}]
+        self._terminal: Dict[int, int] = {}
+        self._lengths: Dict[int, int] = {}
+
+        self.alphabet: Dict[str, int] = {}
+        self.base = array('i')
+        self.check = array('i')
+        self.fail = array('i')
+        self.output = array('i')   # pattern id ending at this state, or -1
+        self.link = array('i')     # next state on the failure chain with an output
+        self.lengths = array('i')  # pattern length by pattern id
+
+    def add(self, pattern: str, pattern_id: int):
+        """Insert a (lower-cased) pattern. Call `build` after the last insert."""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._trie[node].get(ch)
+            if nxt is None:
+                nxt = len(self._trie)
+                self._trie[node][ch] = nxt
+                self._trie.append({})
+            node = nxt
+        self._terminal.setdefault(node, pattern_id)
+        self._lengths[pattern_id] = len(pattern)
+
+    def build(self):
+        """Lay the trie out as a double array, then compute failure and output links."""
+        trie = self._trie
+        for node in trie:
+            for ch in node:
+                if ch not in self.alphabet:
+                    self.alphabet[ch] = len(self.alphabet) + 1
+
+        size = len(trie) + len(self.alphabet) + 1
+        base = array('i', [0]) * size
+        check = array('i', [-1]) * size
+        used = bytearray(size)
+        used[0] = 1
+        slot_of = {0: 0}
+        next_free = 1
+
+        queue = [0]
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            children = sorted((self.alphabet[ch], child) for ch, child in trie[node].items())
+            if not children:
+                continue
+            codes = [code for code, _ in children]
+            b = max(0, next_free - codes[0])
+            while not all(b + code >= size or not used[b + code] for code in codes):
+                b += 1
+            if b + codes[-1] >= size:
+                grow = b + codes[-1] + 1 - size + len(self.alphabet)
+                base.extend([0] * grow)
+                check.extend([-1] * grow)
+                used.extend(bytes(grow))
+                size += grow
+            parent_slot = slot_of[node]
+            base[parent_slot] = b
+            for code, child in children:
+                used[b + code] = 1
+                check[b + code] = parent_slot
+                slot_of[child] = b + code
+                queue.append(child)
+            while next_free < size and used[next_free]:
+                next_free += 1
+
+        output = array('i', [-1]) * size
+        for node, pattern_id in self._terminal.items():
+            output[slot_of[node]] = pattern_id
+        lengths = array('i', [0]) * (max(self._lengths, default=-1) + 1)
+        for pattern_id, length in self._lengths.items():
+            lengths[pattern_id] = length
+
+        self.base, self.check, self.output, self.lengths = base, check, output, lengths
+        self.fail = array('i', [0]) * size
+        self.link = array('i', [0]) * size
+        self._build_links(queue, slot_of)
+
+        self._trie, self._terminal, self._lengths = [{}], {}, {}
+        return self
+
+    def _build_links(self, order: List[int], slot_of: Dict[int, int]):
+        """Breadth-first failure links over the double array."""
+        trie, alphabet = self._trie, self.alphabet
+        base, check, fail, link, output = self.base, self.check, self.fail, self.link, self.output
+        size = len(check)
+        for node in order:
+            parent = slot_of[node]
+            for ch, child in trie[node].items():
+                slot = slot_of[child]
+                target = 0
+                if parent:
+                    code = alphabet[ch]
+                    f = fail[parent]
+                    while True:
+                        t = base[f] + code
+                        if t < size and check[t] == f:
+                            target = t
+                            break
+                        if f == 0:
+                            break
+                        f = fail[f]
+                fail[slot] = target
+                link[slot] = target if output[target] >= 0 else link[target]
+
+    def find(self, text: str) -> Set[int]:
+        """Return ids of all patterns found in `text` on word boundaries."""
+        alphabet, base, check, fail = self.alphabet, self.base, self.check, self.fail
+        output, link, lengths = self.output, self.link, self.lengths
+        size = len(check)
+        found = set()
+        state = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            code = alphabet.get(ch)
+            if code is None:
+                # No pattern contains this character, so no match can span it
+                state = 0
+                continue
+            while True:
+                t = base[state] + code
+                if t < size and check[t] == state:
+                    state = t
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            hit = state if output[state] >= 0 else link[state]
+            if not hit:
+                continue
+            end = i + 1
+            after_word = end < n and _is_word_char(text[end])
+            while hit:
+                pattern_id = output[hit]
+                hit = link[hit]
+                if pattern_id in found:
+                    continue
+                start = end - lengths[pattern_id]
+                # \b at start: word-ness of the previous char differs from the first char
+                before_word = start > 0 and _is_word_char(text[start - 1])
+                if before_word == _is_word_char(text[start]):
+                    continue
+                # \b at end: word-ness of the last char differs from the next char
+                if after_word == _is_word_char(ch):
+                    continue
+                found.add(pattern_id)
+        return found
+
+    def dump(self) -> tuple:
+        """Serialize to marshal-able primitives (alphabet string plus raw array bytes)."""
+        alphabet = ''.join(sorted(self.alphabet, key=self.alphabet.get))
+        arrays = (self.base, self.check, self.fail, self.output, self.link, self.lengths)
+        return (alphabet,) + tuple(a.tobytes() for a in arrays)
+
+    @classmethod
+    def restore(cls, data: tuple) -> 'TermMatcher':
+        matcher = cls()
+        alphabet, *raw = data
+        matcher.alphabet = {ch: code for code, ch in enumerate(alphabet, 1)}
+        arrays = (matcher.base, matcher.check, matcher.fail, matcher.output, matcher.link, matcher.lengths)
+        for a, chunk in zip(arrays, raw):
+            a.frombytes(chunk)
+        return matcher
+
 
 class GlossaryLoader:
-    def __init__(self, glossary_path: str):
+    def __init__(self, glossary_path: str, use_index: bool = True):
         self.glossary_path = Path(glossary_path)
-        self.glossary = {}
+        # Compiled index lives next to the source TSV, e.g. astrodict.txt.idx
+        self.index_path = self.glossary_path.with_name(self.glossary_path.name + '.idx')
+        self.use_index = use_index
+        self._glossary = {}
+        self.originals: List[str] = []
+        self.translations: List[str] = []
+        self._variants: List[List[str]] = []
+        self.matcher = None
+        self._fingerprint = None
         self.load()
+
+    def __len__(self):
+        return len(self.originals)
+
+    @property
+    def glossary(self) -> Dict[str, Dict]:
+        """{lower-cased term: {'original', 'translation', 'variants'}}, rebuilt lazily after an index load."""
+        if self._glossary is None:
+            self._glossary = {
+                original.lower(): {
+                    'original': original,
+                    'translation': translation,
+                    'variants': variants or [original]
+                }
+                for original, translation, variants in zip(self.originals, self.translations, self._variants)
+            }
+        return self._glossary
     
     def load(self):
-        """Load glossary from tab-separated file."""
+        """Load glossary from the compiled index, or from the tab-separated file."""
         if not self.glossary_path.exists():
             print(f"Warning: Glossary file not found: {self.glossary_path}")
             return
+
+        if self.use_index and self.load_index():
+            return
         
+        self._glossary = {}
+        glossary = self._glossary
         with open(self.glossary_path, 'r', encoding='utf-8') as f:
             for line in f:
                 line = line.strip()
@@ -27,17 +256,85 @@ class GlossaryLoader:
                     
                     # Store the term (case-insensitive key)
                     key = english.lower()
-                    if key not in self.glossary:
-                        self.glossary[key] = {
+                    if key not in glossary:
+                        glossary[key] = {
                             'original': english,
                             'translation': chinese,
                             'variants': [english]
                         }
                     else:
                         # Add variant if not already present
-                        if english not in self.glossary[key]['variants']:
-                            self.glossary[key]['variants'].append(english)
+                        if english not in glossary[key]['variants']:
+                            glossary[key]['variants'].append(english)
     
+        self.originals = [data['original'] for data in glossary.values()]
+        self.translations = [data['translation'] for data in glossary.values()]
+        self._variants = [data['variants'] if len(data['variants']) > 1 else None for data in glossary.values()]
+        self.build_matcher()
+        if self.use_index:
+            self.save_index()
+
+    def build_matcher(self):
+        """Compile all variants into a single matcher; term ids follow glossary order."""
+        matcher = TermMatcher()
+        for term_id, data in enumerate(self.glossary.values()):
+            for variant in data['variants']:
+                matcher.add(variant.lower(), term_id)
+        self.matcher = matcher.build()
+
+    def _source_signature(self) -> Dict[str, int]:
+        stat = self.glossary_path.stat()
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def _source_hash(self) -> str:
+        return hashlib.sha256(self.glossary_path.read_bytes()).hexdigest()
+
+    @property
+    def fingerprint(self) -> str:
+        """sha256 of the source TSV; term ids are only comparable between equal fingerprints."""
+        if self._fingerprint is None:
+            self._fingerprint = self._source_hash() if self.glossary_path.exists() else ''
+        return self._fingerprint
+
+    def load_index(self) -> bool:
+        """
+        Restore terms and matcher from the compiled index.
+        Returns False if the index is missing, unreadable or stale.
+        """
+        if not self.index_path.exists():
+            return False
+        try:
+            header, originals, translations, variants, matcher_data = marshal.loads(self.index_path.read_bytes())
+            if header.get('version') != INDEX_FORMAT_VERSION:
+                return False
+            signature = self._source_signature()
+            if (header.get('mtime_ns'), header.get('size')) != (signature['mtime_ns'], signature['size']):
+                # Touched or re-checked-out files keep a valid index if the content is unchanged
+                if header.get('sha256') != self._source_hash():
+                    return False
+            matcher = TermMatcher.restore(matcher_data)
+        except (OSError, EOFError, ValueError, TypeError, KeyError, AttributeError) as e:
+            print(f"Warning: Ignoring unreadable glossary index {self.index_path}: {e}")
+            return False
+
+        self.originals, self.translations, self._variants = originals, translations, variants
+        self._glossary = None
+        self.matcher = matcher
+        self._fingerprint = header.get('sha256')
+        return True
+
+    def save_index(self):
+        """Write the compiled index atomically; failures only cost the next cold start."""
+        header = {'version': INDEX_FORMAT_VERSION, 'sha256': self.fingerprint}
+        header.update(self._source_signature())
+        data = (header, self.originals, self.translations, self._variants, self.matcher.dump())
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        try:
+            tmp_path.write_bytes(marshal.dumps(data))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: Could not write glossary index {self.index_path}: {e}")
+
     def get_translation(self, term: str) -> str:
         """Get translation for a term (case-insensitive)."""
         key = term.lower()
@@ -45,11 +342,43 @@ class GlossaryLoader:
             return self.glossary[key]['translation']
         return None
     
+    def find_term_ids(self, text: str) -> List[int]:
+        """Ids (positions in glossary order) of all terms found in the text."""
+        if not self.matcher:
+            return []
+        return sorted(self.matcher.find(text.lower()))
+
+    def terms_from_ids(self, term_ids: List[int], max_terms: int = 50) -> Dict[str, str]:
+        """Build {english_term: chinese_translation} from precomputed term ids."""
+        relevant = {}
+        # Glossary order decides which terms survive the max_terms cut
+        for term_id in term_ids[:max_terms]:
+            relevant[self.originals[term_id]] = self.translations[term_id]
+        return relevant
+
     def get_relevant_terms(self, text: str, max_terms: int = 50) -> Dict[str, str]:
         """
         Extract relevant glossary terms found in the text.
         Returns a dict of {english_term: chinese_translation}.
         """
+        return self.terms_from_ids(self.find_term_ids(text), max_terms)
+
+    def prescan(self, texts: List[str]) -> Tuple[List[List[int]], Dict[str, int]]:
+        """
+        Match every text once, up front.
+        Returns per-text term id lists and document-level frequencies
+        ({english_term: number of texts containing it}, most frequent first).
+        """
+        block_terms = [self.find_term_ids(text) for text in texts]
+        counts = Counter(term_id for term_ids in block_terms for term_id in term_ids)
+        frequencies = {self.originals[term_id]: count for term_id, count in counts.most_common()}
+        return block_terms, frequencies
+
+    def _get_relevant_terms_regex(self, text: str, max_terms: int = 50) -> Dict[str, str]:
+        """
+        Reference implementation: one word-boundary regex per variant.
+        Kept for differential tests and benchmarks/bench_glossary.py.
+        """
         relevant = {}
         text_lower = text.lower()
         
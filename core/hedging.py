@@ -0,0 +1,50 @@
+from collections import deque
+from typing import Any, Dict, Optional
+
+class Hedger:
+    """
+    Decides when to send a duplicate ("hedge") of a slow request.
+
+    Latencies of completed requests are kept in a rolling window per request
+    kind (single or packed blocks, which differ a lot in size). Once a request
+    has been running longer than the window's `percentile` latency (and at
+    least `min_delay`), a hedge may be sent, as long as hedges stay within
+    `max_fraction` of all requests.
+    """
+
+    def __init__(self, max_fraction: float = 0.05, percentile: float = 95, min_samples: int = 20,
+                 min_delay: float = 1.0, window: int = 500):
+        self.max_fraction = max_fraction
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self._latencies = {}
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float, kind: str = 'single'):
+        self._latencies.setdefault(kind, deque(maxlen=self.window)).append(latency)
+
+    def delay(self, kind: str = 'single') -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies were observed."""
+        samples = self._latencies.get(kind)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def allow(self) -> bool:
+        """Whether one more hedge keeps hedges within max_fraction of requests."""
+        return self.hedges + 1 <= self.requests * self.max_fraction
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_fraction': round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            'delays': {kind: self.delay(kind) for kind in self._latencies}
+        }
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from core.translator import is_failed_translation
+
+
+class TranslationJournal:
+    """
+    Append-only JSONL log of finished block translations.
+
+    Each line records the text block index, a hash of its source text and the
+    translation, and is flushed as soon as it is written, so an interrupted
+    Step 5 can resume with only the missing blocks. Entries whose hash no longer
+    matches the block at that index (the document was re-parsed) are ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+
+    @staticmethod
+    def block_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+    def load(self, texts: List[str]) -> Dict[int, str]:
+        """Return {index: translation} for every journaled block still matching `texts`."""
+        done = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    index, digest, translation = entry['i'], entry['h'], entry['t']
+                except (ValueError, KeyError, TypeError):
+                    # Torn last line from a killed process
+                    continue
+                if 0 <= index < len(texts) and digest == self.block_hash(texts[index]):
+                    done[index] = translation
+        return done
+
+    def record(self, index: int, text: str, translation: str):
+        """Append one finished translation. Failures are not journaled, so they are retried."""
+        if is_failed_translation(translation):
+            return
+        if self._file is None:
+            torn = self._ends_torn()
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if torn:
+                # Terminate a torn last line so the next entry starts on a line of its own
+                self._file.write("\n")
+        entry = {'i': index, 'h': self.block_hash(text), 't': translation}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _ends_torn(self) -> bool:
+        """True if the journal's last line was cut off before its newline."""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def reset(self):
+        """Start a fresh journal, discarding earlier entries."""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
+
+    def close(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter, used like an asyncio.Semaphore (`async with limiter`).
+
+    The limit grows by about one slot per window of successful requests while
+    latency stays near the best observed level, and is cut multiplicatively on
+    throttling (429) or server errors (5xx, timeouts). Decreases are spaced by
+    at least one typical request latency so a single burst of failures counts once.
+    """
+
+    OK = 'ok'
+    THROTTLED = 'throttled'
+    ERROR = 'error'
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 50,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+        self.latency_ewma = None
+        self.latency_floor = None
+        self.peak_limit = self.current_limit
+        self.counts = {self.OK: 0, self.THROTTLED: 0, self.ERROR: 0}
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self):
+        if not self._waiters and self.in_flight < self.current_limit:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just before cancellation; give it back
+                self.release()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.current_limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def locked(self) -> bool:
+        """Whether acquire() would have to wait, as with asyncio.Semaphore."""
+        return bool(self._waiters) or self.in_flight >= self.current_limit
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def record(self, outcome: str, latency: float = None):
+        """Feed back the outcome of one request attempt."""
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        if outcome == self.OK:
+            if latency is not None:
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                self.latency_floor = self.latency_ewma if self.latency_floor is None else min(self.latency_floor, self.latency_ewma)
+            # Additive increase, unless latency says the endpoint is already saturated
+            if self.latency_floor is None or self.latency_ewma <= self.latency_floor * self.latency_tolerance:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.peak_limit = max(self.peak_limit, self.current_limit)
+                self._wake()
+        else:
+            now = time.monotonic()
+            cooldown = max(1.0, self.latency_ewma or 0.0)
+            if now - self._last_decrease >= cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'limit': self.current_limit,
+            'peak_limit': self.peak_limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'outcomes': dict(self.counts),
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None
+        }
@@ -0,0 +1,54 @@
+import re
+from typing import List, Optional, Tuple
+
+# Spans the model must copy verbatim, replaced by {{n}} placeholders before translation:
+# image refs, code spans, inline $...$ math (opening $ followed and closing $ preceded
+# by a non-space, so "$5 and $10" is left alone), footnote markers, inline HTML tags,
+# link targets (the link text is still translated) and bare URLs
+_SPAN_PATTERN = re.compile(
+    r'!\[[^\]\n]*\]\([^)\n]*\)'
+    r'|``[^\n]+?``|`[^`\n]+`'
+    r'|(?<![\\$])\$(?=[^\s$])[^$\n]*?(?<=[^\s\\])\$(?!\$|\d)'
+    r'|\[\^[^\]\n]+\]'
+    r'|</?[A-Za-z][^<>\n]*>'
+    r'|\]\((?P<target>[^)\s]+)\)'
+    r'|https?://[^\s<>()\[\]]*[^\s<>()\[\].,;:!?\'"]'
+)
+_PLACEHOLDER = re.compile(r'\{\{\s*(\d+)\s*\}\}')
+
+def placeholder(n: int) -> str:
+    return f"{{{{{n}}}}}"
+
+def mask_spans(text: str, start: int = 0) -> Tuple[str, List[str]]:
+    """
+    Replace spans that must not be translated with numbered placeholders
+    ({{start}}, {{start+1}}, ...). Returns the masked text and the original spans
+    in placeholder order. Text that already contains something looking like a
+    placeholder is returned unmasked.
+    """
+    if _PLACEHOLDER.search(text):
+        return text, []
+    spans = []
+    parts = []
+    position = 0
+    for match in _SPAN_PATTERN.finditer(text):
+        # Link targets: only the URL inside "](...)" is masked
+        begin, end = match.span('target') if match.group('target') else match.span()
+        parts.append(text[position:begin])
+        parts.append(placeholder(start + len(spans)))
+        spans.append(text[begin:end])
+        position = end
+    if not spans:
+        return text, []
+    parts.append(text[position:])
+    return ''.join(parts), spans
+
+def unmask_spans(translation: str, spans: List[str], start: int = 0) -> Optional[str]:
+    """
+    Put the original spans back. Returns None unless every placeholder
+    start..start+len(spans)-1 came back exactly once and no other one appeared.
+    """
+    found = [int(n) for n in _PLACEHOLDER.findall(translation)]
+    if sorted(found) != list(range(start, start + len(spans))):
+        return None
+    return _PLACEHOLDER.sub(lambda match: spans[int(match.group(1)) - start], translation)
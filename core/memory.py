@@ -0,0 +1,188 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse all whitespace runs so reflowed copies of a block compare (and hash) equal."""
+    return ' '.join(text.split())
+
+
+class TranslationMemory:
+    """
+    Persistent translation cache backed by SQLite.
+
+    Entries are keyed on a hash of the whitespace-normalized source text, the
+    model name, the system prompt and the injected glossary, so any change to
+    what the LLM would see produces a new key. Changes are committed in batches
+    of COMMIT_INTERVAL and on close(). When the stored text exceeds
+    `max_size_mb`, the least recently used entries are evicted.
+    """
+
+    # Check the size budget every N writes instead of on each one
+    EVICT_CHECK_INTERVAL = 100
+    # Lookups and stores run on the event loop: commit in batches, not per statement
+    COMMIT_INTERVAL = 50
+
+    def __init__(self, db_path: str, max_size_mb: float = 200):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._pending = 0
+
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(text: str, model: str, system_prompt: str, glossary: Optional[str] = None) -> str:
+        material = json.dumps([normalize_whitespace(text), model, system_prompt, glossary or ''], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached translation and mark it as recently used, or None."""
+        return self.get_any([key])
+
+    def get_any(self, keys: List[str]) -> Optional[str]:
+        """Return the translation stored under the first of `keys` that has one (one hit or miss), or None."""
+        placeholders = ','.join('?' * len(keys))
+        rows = dict(self.conn.execute(
+            f"SELECT key, translation FROM translations WHERE key IN ({placeholders})", keys
+        ).fetchall())
+        key = next((key for key in keys if key in rows), None)
+        if key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE translations SET hits = hits + 1, last_used = ? WHERE key = ?",
+            (time.time(), key)
+        )
+        self._changed()
+        return rows[key]
+
+    def put(self, key: str, source: str, translation: str, model: str):
+        now = time.time()
+        size = len(source.encode('utf-8')) + len(translation.encode('utf-8'))
+        self.conn.execute(
+            """INSERT INTO translations (key, model, source, translation, size, hits, created, last_used)
+               VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET translation = excluded.translation,
+                   size = excluded.size, last_used = excluded.last_used""",
+            (key, model, source, translation, size, now, now)
+        )
+        self._writes += 1
+        self._changed()
+        if self._writes % self.EVICT_CHECK_INTERVAL == 0:
+            self.evict()
+
+    def _changed(self):
+        """Commit every COMMIT_INTERVAL changes rather than on each one; close() commits the rest."""
+        self._pending += 1
+        if self._pending >= self.COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def total_size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the store is back under 90% of its budget."""
+        total = self.total_size()
+        if total <= self.max_size_bytes:
+            return 0
+        target = int(self.max_size_bytes * 0.9)
+        rows = self.conn.execute("SELECT key, size FROM translations ORDER BY last_used ASC").fetchall()
+        stale_keys = []
+        for key, size in rows:
+            if total <= target:
+                break
+            stale_keys.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM translations WHERE key = ?", stale_keys)
+        self.commit()
+        return len(stale_keys)
+
+    def purge(self, model: str = None) -> int:
+        """Delete all entries, or only those produced by `model`."""
+        if model:
+            cursor = self.conn.execute("DELETE FROM translations WHERE model = ?", (model,))
+        else:
+            cursor = self.conn.execute("DELETE FROM translations")
+        self.commit()
+        self.conn.execute("VACUUM")
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size, stored_hits = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM translations"
+        ).fetchone()
+        models = dict(self.conn.execute(
+            "SELECT model, COUNT(*) FROM translations GROUP BY model ORDER BY COUNT(*) DESC"
+        ).fetchall())
+        return {
+            'entries': entries,
+            'size_bytes': size,
+            'max_size_bytes': self.max_size_bytes,
+            'lifetime_hits': stored_hits,
+            'session_hits': self.hits,
+            'session_misses': self.misses,
+            'models': models
+        }
+
+    def close(self):
+        if self.conn:
+            self.evict()
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+if __name__ == "__main__":
+    import argparse
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Inspect or purge the translation memory")
+    parser.add_argument("command", choices=['stats', 'purge', 'evict'], help="Action to run")
+    parser.add_argument("--db", default=Config.TM_PATH, help=f"Path to the translation memory (default: {Config.TM_PATH})")
+    parser.add_argument("--model", help="Only purge entries produced by this model")
+    args = parser.parse_args()
+
+    memory = TranslationMemory(args.db, Config.TM_MAX_SIZE_MB)
+    if args.command == 'stats':
+        stats = memory.stats()
+        print(f"📂 Translation memory: {memory.db_path}")
+        print(f"   Entries: {stats['entries']}")
+        print(f"   Size: {stats['size_bytes'] / 1024 / 1024:.2f} MB of {stats['max_size_bytes'] / 1024 / 1024:.0f} MB")
+        print(f"   Lifetime hits: {stats['lifetime_hits']}")
+        for model, count in stats['models'].items():
+            print(f"   - {model}: {count} entries")
+    elif args.command == 'purge':
+        removed = memory.purge(args.model)
+        print(f"🗑️  Removed {removed} entries" + (f" for model {args.model}" if args.model else ""))
+    else:
+        removed = memory.evict()
+        print(f"🗑️  Evicted {removed} least recently used entries")
+    memory.close()
@@ -1,14 +1,96 @@
-import re
-from dataclasses import dataclass
-from typing import List, Dict, Any
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Union
 
-@dataclass
 class ContentBlock:
-    type: str  # 'text', 'code', 'image', 'formula', 'header', 'separator'
-    content: str
-    original: str  # The original markdown text
-    translation: str = None
-    metadata: Dict[str, Any] = None
+    """
+    One parsed markdown block. Slotted to keep per-block overhead small on large
+    books; `original` is only stored when it differs from `content` (for parsed
+    blocks, only separators), so most blocks hold one string instead of two.
+    """
+    __slots__ = ('type', 'content', '_original', 'translation', 'metadata')
+
+    def __init__(self, type: str, content: str, original: str = None, translation: str = None,
+                 metadata: Dict[str, Any] = None):
+        self.type = type  # 'text', 'code', 'image', 'formula', 'header', 'separator', 'passthrough' (text left untranslated)
+        self.content = content
+        # The original markdown text (set directly rather than through the property: parsing creates a block per line)
+        self._original = None if original is None or original is content or original == content else original
+        self.translation = translation
+        self.metadata = metadata
+
+    @property
+    def original(self) -> str:
+        return self.content if self._original is None else self._original
+
+    @original.setter
+    def original(self, value: str):
+        self._original = None if value is None or value == self.content else value
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return ((self.type, self.content, self.original, self.translation, self.metadata)
+                == (other.type, other.content, other.original, other.translation, other.metadata))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"ContentBlock(type={self.type!r}, content={self.content!r}, original={self.original!r}, "
+                f"translation={self.translation!r}, metadata={self.metadata!r})")
+
+def serialize_blocks(blocks: Iterable[ContentBlock]) -> List[list]:
+    """
+    Compact JSON rows for the pipeline state: [type, content] plus original (only if it
+    differs), translation and metadata when set, and ['separator', n] for a run of n
+    blank lines.
+    """
+    rows = []
+    for block in blocks:
+        if block.type == 'separator' and not block.content and block.original == '\n' \
+                and block.translation is None and block.metadata is None:
+            if rows and rows[-1][0] == 'separator' and isinstance(rows[-1][1], int):
+                rows[-1][1] += 1
+            else:
+                rows.append(['separator', 1])
+            continue
+        row = [block.type, block.content, block._original, block.translation, block.metadata]
+        while row[-1] is None:
+            row.pop()
+        rows.append(row)
+    return rows
+
+def deserialize_blocks(rows: Iterable) -> List[ContentBlock]:
+    """Rebuild blocks from `serialize_blocks` rows (or the per-block dicts of older states)."""
+    blocks = []
+    for row in rows:
+        if isinstance(row, dict):
+            blocks.append(ContentBlock(**row))
+        elif row[0] == 'separator' and isinstance(row[1], int):
+            blocks.extend(ContentBlock('separator', '', '\n') for _ in range(row[1]))
+        else:
+            blocks.append(ContentBlock(*row))
+    return blocks
+
+# First characters of the lines that can open or close a block: ``` fences, $$ fences,
+# '#' headers and '![' images
+_SPECIAL_STARTS = frozenset('`$#!')
+
+# Characters read (or sliced) at a time when splitting a source into lines
+_READ_SIZE = 1 << 20
+
+def _split_pieces(pieces: Iterable[str]) -> Iterator[str]:
+    """Lines of consecutive text pieces, split with str.split so only one piece is held at a time."""
+    pending = ''
+    for piece in pieces:
+        lines = (pending + piece).split('\n')
+        pending = lines.pop()
+        yield from lines
+    yield pending
+
+def _image_end(line: str) -> bool:
+    """Whether an image line opened with '![' has the '](...)' the image regex requires."""
+    target = line.find('](', 2)
+    return target != -1 and line.find(')', target + 2) != -1
 
 class MarkdownProcessor:
     def __init__(self):
@@ -18,104 +100,126 @@ class MarkdownProcessor:
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
 
-    def parse(self, markdown_text: str) -> List[ContentBlock]:
+    @staticmethod
+    def iter_lines(source: Union[str, os.PathLike, Iterable[str]]) -> Iterator[str]:
+        """
+        Lines of a markdown source without their line endings, with the same result as
+        `text.split('\n')`: a source ending in a newline yields a final empty line.
+        `source` is markdown text, a path (os.PathLike, read lazily) or an iterable of
+        lines such as an open file.
+        """
+        if isinstance(source, str):
+            yield from _split_pieces(source[i:i + _READ_SIZE] for i in range(0, len(source), _READ_SIZE))
+            return
+        if isinstance(source, os.PathLike):
+            with open(source, 'r', encoding='utf-8') as f:
+                yield from _split_pieces(iter(lambda: f.read(_READ_SIZE), ''))
+            return
+        ended = True
+        for line in source:
+            ended = line.endswith('\n')
+            yield line[:-1] if ended else line
+        if ended:
+            yield ''
+
+    def parse(self, source: Union[str, os.PathLike, Iterable[str]]) -> List[ContentBlock]:
         """
         Parse markdown text into a list of ContentBlocks.
         """
-        blocks = []
-        lines = markdown_text.split('\n')
-        
+        return list(self.iter_blocks(source))
+
+    def iter_blocks(self, source: Union[str, os.PathLike, Iterable[str]]) -> Iterator[ContentBlock]:
+        """
+        Parse markdown into ContentBlocks, yielding each block as soon as it is complete.
+        Only the lines of the block being read are held in memory, so a book can be
+        parsed straight from its file (see `iter_lines` for the accepted sources).
+
+        Lines are dispatched on their first character: most lines cannot start a fence,
+        header or image, and only need one set lookup before being appended to the
+        current block or ending it.
+        """
         current_content = []
-        
-        # Regex patterns
-        code_block_pattern = re.compile(r'^```')
-        header_pattern = re.compile(r'^#+\s')
-        image_pattern = re.compile(r'!\[.*?\]\(.*?\)')
-        math_block_pattern = re.compile(r'^\$\$')
-        
         in_code_block = False
         in_math_block = False
         
-        for line in lines:
-            # Handle Code Blocks
-            if code_block_pattern.match(line):
+        for line in self.iter_lines(source):
+            first = line[:1]
+            if first not in _SPECIAL_STARTS:
+                if in_code_block or in_math_block or (line and not line.isspace()):
+                    current_content.append(line)
+                else:
+                    # Blank line
+                    if current_content:
+                        yield from self._text_block(current_content)
+                        current_content = []
+                    yield ContentBlock('separator', '', '\n')
+                continue
+
+            # Handle Code Blocks (```)
+            if first == '`' and line.startswith('```'):
                 if in_code_block:
                     # End of code block
                     current_content.append(line)
-                    blocks.append(ContentBlock('code', '\n'.join(current_content), '\n'.join(current_content)))
+                    text = '\n'.join(current_content)
+                    yield ContentBlock('code', text, text)
                     current_content = []
                     in_code_block = False
-                    continue
                 else:
                     # Start of code block
                     if current_content:
-                        self._save_text_block(blocks, current_content)
+                        yield from self._text_block(current_content)
                         current_content = []
                     in_code_block = True
                     current_content.append(line)
-                    continue
+                continue
             
             if in_code_block:
                 current_content.append(line)
                 continue
 
             # Handle Math Blocks ($$)
-            if math_block_pattern.match(line):
+            if first == '$' and line.startswith('$$'):
                 if in_math_block:
                     # End of math block
                     current_content.append(line)
-                    blocks.append(ContentBlock('formula', '\n'.join(current_content), '\n'.join(current_content)))
+                    text = '\n'.join(current_content)
+                    yield ContentBlock('formula', text, text)
                     current_content = []
                     in_math_block = False
-                    continue
                 else:
                     # Start of math block
                     if current_content:
-                        self._save_text_block(blocks, current_content)
+                        yield from self._text_block(current_content)
                         current_content = []
                     in_math_block = True
                     current_content.append(line)
-                    continue
+                continue
             
             if in_math_block:
                 current_content.append(line)
                 continue
 
-            # Handle Headers
-            if header_pattern.match(line):
-                if current_content:
-                    self._save_text_block(blocks, current_content)
-                    current_content = []
-                blocks.append(ContentBlock('header', line, line))
-                continue
-
-            # Handle Images
-            if image_pattern.match(line):
+            # Headers: one or more '#' followed by whitespace.
+            # Images: '![' with a '](' later followed by a ')'
+            if (first == '#' and line.lstrip('#')[:1].isspace()) or (
+                    first == '!' and line.startswith('![') and _image_end(line)):
                 if current_content:
-                    self._save_text_block(blocks, current_content)
+                    yield from self._text_block(current_content)
                     current_content = []
-                blocks.append(ContentBlock('image', line, line))
+                yield ContentBlock('header' if first == '#' else 'image', line, line)
                 continue
 
-            # Regular Text
-            if line.strip() == "":
-                if current_content:
-                    self._save_text_block(blocks, current_content)
-                    current_content = []
-                blocks.append(ContentBlock('separator', '', '\n'))
-            else:
-                current_content.append(line)
+            # Regular text that happens to start with one of the special characters
+            current_content.append(line)
         
         # Flush remaining content
         if current_content:
-            self._save_text_block(blocks, current_content)
-            
-        return blocks
+            yield from self._text_block(current_content)
 
-    def _save_text_block(self, blocks, content_lines):
+    def _text_block(self, content_lines) -> Iterator[ContentBlock]:
         text = '\n'.join(content_lines)
         if text.strip():
-            blocks.append(ContentBlock('text', text, text))
+            yield ContentBlock('text', text, text)
 
     def inject_translations(self, blocks: List[ContentBlock], translations: List[str]):
         """
@@ -0,0 +1,43 @@
+import re
+from typing import Dict, List, Optional
+from core.tokens import CJK_IDEOGRAPH, estimate_tokens
+from core.translator import is_failed_translation
+
+_LETTER_PATTERN = re.compile(r'[A-Za-z]')
+
+# Sources with fewer Latin letters than this (labels, numbers, formulas) are
+# legitimately left as-is by the model and never flagged as untranslated
+MIN_LETTERS_FOR_LANGUAGE_CHECK = 20
+# Below this size the length ratio is too noisy to call a translation truncated
+MIN_TOKENS_FOR_LENGTH_CHECK = 40
+# English -> Chinese translations come out at roughly the same estimated token
+# count as the source; far less than that means the output was cut off
+MIN_LENGTH_RATIO = 0.3
+
+def check_translation(source: str, translation: str) -> Optional[str]:
+    """
+    Return why a translation needs to be redone ('failed', 'empty',
+    'untranslated', 'truncated'), or None if it looks fine.
+    """
+    if not source.strip():
+        return None
+    if is_failed_translation(translation):
+        return 'failed'
+    if not translation.strip():
+        return 'empty'
+    if len(_LETTER_PATTERN.findall(source)) >= MIN_LETTERS_FOR_LANGUAGE_CHECK and not CJK_IDEOGRAPH.search(translation):
+        return 'untranslated'
+    source_tokens = estimate_tokens(source)
+    if source_tokens >= MIN_TOKENS_FOR_LENGTH_CHECK and estimate_tokens(translation) < source_tokens * MIN_LENGTH_RATIO:
+        return 'truncated'
+    return None
+
+def find_retry_candidates(sources: List[str], translations: List[str]) -> Dict[int, str]:
+    """Map text block index -> reason for every translation that should be re-sent."""
+    candidates = {}
+    for i, source in enumerate(sources):
+        translation = translations[i] if i < len(translations) else None
+        reason = check_translation(source, translation)
+        if reason:
+            candidates[i] = reason
+    return candidates
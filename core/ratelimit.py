@@ -0,0 +1,152 @@
+import asyncio
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Mapping, Optional
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (requests above capacity wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        """Take tokens; the level may go negative to record debt from underestimates."""
+        self._refill()
+        self.level -= amount
+
+    def cap(self, remaining: float):
+        """Align with the provider's own count when it reports fewer tokens left than we think."""
+        self._refill()
+        self.level = min(self.level, remaining)
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse rate-limit reset values: plain seconds ("1.5") or Go-style
+    durations as sent in x-ratelimit-reset-* ("6m0s", "20ms", "1h2m").
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts or ''.join(n + u for n, u in parts) != value:
+        return None
+    scale = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After is either delay-seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """
+    Client-side request and token quotas (RPM/TPM), plus a shared pause
+    driven by Retry-After and x-ratelimit-* response headers.
+
+    Callers are admitted one at a time in FIFO order, so coroutines queue
+    behind the buckets instead of all firing and retrying together.
+    Either bucket may be disabled by passing 0. Bursts are capped at
+    BURST_SECONDS worth of quota, since providers often enforce per-minute
+    limits over shorter windows.
+    """
+
+    BURST_SECONDS = 10
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        burst = self.BURST_SECONDS / 60.0
+        self.requests = TokenBucket(rpm, rpm * burst, clock=clock) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm * burst, clock=clock) if tpm else None
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def wait_time(self, tokens: int) -> float:
+        wait = self.paused_until - self.clock()
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return max(0.0, wait)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request carrying ~`tokens` tokens fits in both quotas, then take it."""
+        async with self._lock:
+            while True:
+                wait = self.wait_time(tokens)
+                if wait <= 0:
+                    break
+                self.waited += wait
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(tokens)
+
+    def adjust(self, delta_tokens: int):
+        """Correct the token bucket once the actual usage of a request is known."""
+        if self.tokens and delta_tokens:
+            self.tokens.consume(delta_tokens)
+
+    def is_paused(self) -> bool:
+        return self.clock() < self.paused_until
+
+    def pause_remaining(self) -> float:
+        return max(0.0, self.paused_until - self.clock())
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds` (never shortens an existing pause)."""
+        if seconds and seconds > 0:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> Optional[float]:
+        """
+        Apply provider rate-limit headers. Returns the Retry-After delay if one was sent.
+        """
+        retry_after = parse_retry_after(headers.get('Retry-After') or headers.get('retry-after'))
+        if retry_after is not None:
+            self.pause(retry_after)
+
+        for kind, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            if bucket:
+                bucket.cap(remaining)
+            if remaining <= 0:
+                self.pause(parse_duration(headers.get(f'x-ratelimit-reset-{kind}')))
+        return retry_after
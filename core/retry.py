@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, capped by a total number of attempts
+    and an optional retry budget per error class.
+
+    `budgets` maps an error class to the number of retries allowed for it,
+    e.g. {'timeout': 1} gives up after the second timeout even if attempts
+    remain. Classes without a budget are only limited by `max_attempts`.
+    """
+
+    THROTTLED = 'throttled'
+    SERVER_ERROR = 'server_error'
+    TIMEOUT = 'timeout'
+    NETWORK = 'network'
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 60.0,
+                 budgets: Dict[str, int] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budgets = dict(budgets or {})
+
+    @classmethod
+    def from_config(cls) -> 'RetryPolicy':
+        return cls(Config.RETRY_ATTEMPTS, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY,
+                   cls.parse_budgets(Config.RETRY_BUDGETS))
+
+    @staticmethod
+    def parse_budgets(spec: str) -> Dict[str, int]:
+        """Parse "timeout=1,server_error=2" into {'timeout': 1, 'server_error': 2}."""
+        budgets = {}
+        for item in (spec or '').split(','):
+            if item.strip():
+                name, _, value = item.partition('=')
+                budgets[name.strip()] = int(value)
+        return budgets
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2**retry)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def start(self) -> 'RetryState':
+        return RetryState(self)
+
+class RetryState:
+    """Retry bookkeeping for one request."""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.attempts = 0
+        self.counts = {}
+
+    def next_delay(self, error_class: str, retry_after: float = None) -> Optional[float]:
+        """
+        Record a failed attempt. Returns how long to wait before the next one,
+        or None when the attempts or this error class's budget are used up.
+        A server-provided Retry-After takes precedence over the backoff.
+        """
+        self.attempts += 1
+        self.counts[error_class] = self.counts.get(error_class, 0) + 1
+        if self.attempts >= self.policy.max_attempts:
+            return None
+        budget = self.policy.budgets.get(error_class)
+        if budget is not None and self.counts[error_class] > budget:
+            return None
+        if retry_after is not None:
+            return retry_after
+        return self.policy.backoff(self.attempts - 1)
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a backend that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and callers
+    of `wait()` pause instead of each timing out on their own. Once
+    `recovery_timeout` has passed a single probe request is let through
+    (half-open): success closes the circuit, failure re-opens it with the
+    timeout doubled, up to `max_recovery_timeout`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 max_recovery_timeout: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_recovery_timeout = recovery_timeout
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.clock = clock
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.outage_seconds = 0.0
+        self._outage_started = None
+        self._probe_started = None
+        self._changed = asyncio.Event()
+
+    def allow(self) -> bool:
+        """Whether a request may go out now (claims the probe slot when half-open)."""
+        now = self.clock()
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now >= self.opened_at + self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_started = None
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back (e.g. cancelled) does not block forever
+            if self._probe_started is None or now - self._probe_started > self.recovery_timeout:
+                self._probe_started = now
+                return True
+        return False
+
+    async def wait(self):
+        """Return once a request may be sent, pausing while the circuit is open."""
+        while not self.allow():
+            if self.state == self.OPEN:
+                delay = self.opened_at + self.recovery_timeout - self.clock()
+            else:
+                delay = self.recovery_timeout
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), max(delay, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit closed: backend is responding again")
+        if self._outage_started is not None:
+            self.outage_seconds += self.clock() - self._outage_started
+            self._outage_started = None
+        self.state = self.CLOSED
+        self.failures = 0
+        self.recovery_timeout = self.base_recovery_timeout
+        self._changed.set()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.recovery_timeout = min(self.max_recovery_timeout, self.recovery_timeout * 2)
+            self._open()
+        elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        if self._outage_started is None:
+            self._outage_started = self.opened_at
+        self.times_opened += 1
+        logger.warning(f"Circuit open after {self.failures} consecutive failures: "
+                       f"pausing requests for {self.recovery_timeout:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'times_opened': self.times_opened,
+            # Time from first opening to recovery, summed over outages
+            'outage_seconds': round(self.outage_seconds, 2)
+        }
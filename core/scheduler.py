@@ -0,0 +1,60 @@
+import asyncio
+import heapq
+import itertools
+from typing import Any, Awaitable, Callable, List
+from core.tokens import estimate_tokens
+
+# Orders in which translation requests can be dispatched
+SCHEDULES = ('longest_first', 'document', 'shortest_first')
+
+def group_priority(schedule: str, texts: List[str]) -> Callable[[List[int]], float]:
+    """
+    Priority function for a request (a group of block indices); lower runs first.
+    'longest_first' starts the biggest requests early so they do not end up as the
+    critical path at the end of the run.
+    """
+    if schedule == 'longest_first':
+        return lambda group: -sum(estimate_tokens(texts[i]) for i in group)
+    if schedule == 'shortest_first':
+        return lambda group: sum(estimate_tokens(texts[i]) for i in group)
+    if schedule == 'document':
+        return lambda group: group[0]
+    raise ValueError(f"Unknown schedule: {schedule}. Available: {list(SCHEDULES)}")
+
+class WorkQueue:
+    """
+    Priority queue of work items drained by a fixed number of workers.
+    Items with equal priority run in insertion order.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def put(self, item: Any, priority: float = 0):
+        heapq.heappush(self._heap, (priority, next(self._counter), item))
+
+    def pop(self) -> Any:
+        return heapq.heappop(self._heap)[2]
+
+    async def run(self, handler: Callable[[Any], Awaitable[None]]):
+        """
+        Process every item with `handler` until the queue is empty. If a handler
+        raises, the other workers are cancelled and the exception propagates.
+        """
+        async def worker():
+            while self._heap:
+                await handler(self.pop())
+
+        tasks = [asyncio.create_task(worker()) for _ in range(min(self.workers, len(self._heap)))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled handlers unwind before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,20 @@
+import re
+
+# The one definition of CJK text, shared by the chunker, classifier and quality checks.
+# Ideographs (extension A, unified, compatibility) are what make text Chinese; punctuation
+# and full-width forms alone don't
+CJK_IDEOGRAPHS = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# Plus CJK punctuation, kana and full-width forms: written without spaces, roughly one token each
+CJK_CHARACTERS = r'\u3000-\u30ff' + CJK_IDEOGRAPHS + r'\uff00-\uffef'
+CJK_IDEOGRAPH = re.compile(f'[{CJK_IDEOGRAPHS}]')
+CJK_CHARACTER = re.compile(f'[{CJK_CHARACTERS}]')
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate BPE token count without a tokenizer:
+    one token per CJK character, one per ~4 characters of everything else.
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_CHARACTER.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -2,87 +2,540 @@ import asyncio
 import aiohttp
 import json
 import logging
+import re
+import time
 from pathlib import Path
+from typing import List, Optional, Tuple
 from config import Config
 from core.glossary import GlossaryLoader
+from core.memory import TranslationMemory
+from core.limiter import AdaptiveLimiter
+from core.endpoints import Endpoint, EndpointPool
+from core.retry import CircuitBreaker, RetryPolicy
+from core.hedging import Hedger
+from core.masking import mask_spans, unmask_spans
+from core.tokens import estimate_tokens
+from core.usage import TokenBudgetExceeded, UsageTracker, parse_prices
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sentinels returned instead of a translation when a request gives up
+FAILURE_PREFIXES = ("[Translation Failed", "[Translation Error")
+
+def is_failed_translation(text: str) -> bool:
+    return text is None or text.startswith(FAILURE_PREFIXES)
+
+# A response and the model that produced it (None when the request gave up)
+Reply = Tuple[str, Optional[str]]
+
+SEGMENT_MARKER = re.compile(r'^[ \t]*<<<SEGMENT (\d+)>>>[ \t]*$', re.MULTILINE)
+
+def split_segments(response: str, expected: int) -> Optional[List[str]]:
+    """
+    Split a packed response on its <<<SEGMENT n>>> marker lines.
+    Returns None unless markers 1..expected appear exactly once each, in order,
+    with nothing before the first one and a non-empty segment after each.
+    """
+    markers = list(SEGMENT_MARKER.finditer(response))
+    if [int(m.group(1)) for m in markers] != list(range(1, expected + 1)):
+        return None
+    if response[:markers[0].start()].strip():
+        return None
+    segments = []
+    for m, following in zip(markers, markers[1:] + [None]):
+        end = following.start() if following else len(response)
+        segment = response[m.end():end].strip()
+        if not segment:
+            return None
+        segments.append(segment)
+    return segments
+
+def glossary_section(glossary: GlossaryLoader, text: str, term_ids: List[int] = None) -> Optional[str]:
+    """Glossary terms relevant to `text` formatted for the prompt, or None. `term_ids` come from the pre-scan."""
+    if term_ids is not None:
+        relevant_terms = glossary.terms_from_ids(term_ids, max_terms=50)
+    else:
+        relevant_terms = glossary.get_relevant_terms(text, max_terms=50)
+    if relevant_terms:
+        return glossary.format_for_prompt(relevant_terms)
+    return None
+
+def packed_glossary_section(glossary: GlossaryLoader, texts: List[str], term_ids_list: List[List[int]]) -> Optional[str]:
+    """One glossary section covering the union of the packed blocks' terms, or None."""
+    union = set()
+    for text, term_ids in zip(texts, term_ids_list):
+        union.update(term_ids if term_ids is not None else glossary.find_term_ids(text))
+    relevant_terms = glossary.terms_from_ids(sorted(union), max_terms=50)
+    if relevant_terms:
+        return glossary.format_for_prompt(relevant_terms)
+    return None
+
+def pack_segments(texts: List[str]) -> str:
+    """Join blocks into one request text, each preceded by its segment marker."""
+    return "\n\n".join(f"<<<SEGMENT {n}>>>\n{text}" for n, text in enumerate(texts, 1))
+
 class Translator:
-    def __init__(self, glossary_path: str = None):
-        self.semaphore = asyncio.Semaphore(Config.MAX_CONCURRENCY)
-        self.headers = Config.get_headers()
-        self.base_url = Config.BASE_URL
+    # Expected completion size relative to the source text, used to reserve
+    # TPM quota before the real usage is known
+    COMPLETION_TOKEN_RATIO = 1.5
+
+    def __init__(self, glossary_path: str = None, memory: TranslationMemory = None, refresh_memory: bool = False,
+                 retry_policy: RetryPolicy = None, token_budget: int = None):
+        if Config.CONCURRENCY_MODE == 'adaptive':
+            self.semaphore = AdaptiveLimiter(
+                Config.MAX_CONCURRENCY,
+                min_limit=Config.ADAPTIVE_MIN_CONCURRENCY,
+                max_limit=Config.ADAPTIVE_MAX_CONCURRENCY
+            )
+        else:
+            self.semaphore = asyncio.Semaphore(Config.MAX_CONCURRENCY)
+        # Each endpoint carries its own rate limiter, so Retry-After / x-ratelimit-*
+        # headers pause requests to that endpoint even when no RPM/TPM quota is configured
+        self.pool = EndpointPool.from_config()
+        self.retry_policy = retry_policy or RetryPolicy.from_config()
+        # Opens when every endpoint keeps failing, so queued blocks pause instead of timing out one by one;
+        # a single bad endpoint in a pool is handled by ejection instead
+        self.breaker = CircuitBreaker(Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RECOVERY_SECONDS)
+        self.hedger = Hedger(Config.HEDGE_MAX_FRACTION, min_delay=Config.HEDGE_MIN_DELAY) if Config.HEDGE_REQUESTS else None
+        # HTTP requests sent, retries and hedges included (translation memory hits send none)
+        self.requests_sent = 0
+        # Per streamed HTTP request whose answer was used: time to first token, tokens/sec and
+        # how many blocks it carried (a packed request is one sample for all its blocks)
+        self.stream_timings = []
+        # Spans replaced by placeholders, and responses that lost one and were re-sent
+        self.masked_spans = 0
+        self.mask_fallbacks = 0
+        # Token usage, latency and cost per stage and model, and tokens per source block
+        self.usage = UsageTracker(parse_prices(Config.TOKEN_PRICES))
+        # Hard cap on prompt + completion tokens for this translator (0 disables); requests
+        # in flight count with their estimate until their usage is known
+        self.token_budget = Config.TOKEN_BUDGET if token_budget is None else token_budget
+        self._reserved_tokens = 0
+        self.memory = memory
+        # Skip memory lookups but still store results, so re-translated blocks replace bad entries
+        self.refresh_memory = refresh_memory
         
         # Use TCPConnector with DNS caching (TTL=300s)
         connector = aiohttp.TCPConnector(ttl_dns_cache=300)
         self.session = aiohttp.ClientSession(connector=connector)
+        self.pool.start_health_checks(self.session, Config.HEALTH_CHECK_INTERVAL)
         
         # Load glossary if provided
         self.glossary = None
         if glossary_path:
             self.glossary = GlossaryLoader(glossary_path)
-            logger.info(f"Loaded glossary with {len(self.glossary.glossary)} terms")
-        if not self.base_url.endswith('/v1'):
-             # Ensure base_url ends with /v1 if needed, or just trust config
-             # OpenAI compatible usually is .../v1
-             pass
+            logger.info(f"Loaded glossary with {len(self.glossary)} terms")
 
-    async def translate(self, text: str, use_glossary: bool = True) -> str:
+    async def translate(self, text: str, use_glossary: bool = True, term_ids: List[int] = None) -> str:
         """
         Translate text using the configured LLM API.
+        `term_ids` are glossary term ids precomputed by the Step 4.1 pre-scan;
+        when omitted, the glossary is matched against the text here.
+        Translations are served from / stored to the translation memory if one is attached.
         """
         if not text.strip():
             return ""
 
-        async with self.semaphore:
-            return await self._make_request(text, use_glossary)
+        specific_glossary = self._specific_glossary(text, use_glossary, term_ids)
+
+        cached = self._memory_lookup(text, specific_glossary)
+        if cached is not None:
+            return cached
+
+        result, model = await self._request_masked(text, specific_glossary)
+
+        self._memory_store(text, specific_glossary, result, model)
+        return result
+
+    async def translate_packed(self, texts: List[str], term_ids_list: List[List[int]] = None,
+                               use_glossary: bool = True) -> Optional[List[str]]:
+        """
+        Translate several blocks in one request, each preceded by a segment marker.
+        Blocks already in the translation memory are not sent. Segments of a packed
+        response are not stored in it: they were made with the packed prompt and the
+        union glossary, not the prompt a single block gets. Returns None when the
+        response does not split back into exactly one segment per block, so the
+        caller can fall back to per-block requests.
+        """
+        if term_ids_list is None:
+            term_ids_list = [None] * len(texts)
+
+        results = [None] * len(texts)
+        glossaries = [None] * len(texts)
+        for i, (text, term_ids) in enumerate(zip(texts, term_ids_list)):
+            if not text.strip():
+                results[i] = ""
+                continue
+            glossaries[i] = self._specific_glossary(text, use_glossary, term_ids)
+            results[i] = self._memory_lookup(text, glossaries[i])
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        if len(pending) == 1:
+            i = pending[0]
+            results[i], model = await self._request_masked(texts[i], glossaries[i])
+            self._memory_store(texts[i], glossaries[i], results[i], model)
+            return results
 
-    async def _make_request(self, text: str, use_glossary: bool = True) -> str:
-        # Extract relevant glossary terms if available
         specific_glossary = None
         if use_glossary and self.glossary:
-            relevant_terms = self.glossary.get_relevant_terms(text, max_terms=50)
-            if relevant_terms:
-                specific_glossary = self.glossary.format_for_prompt(relevant_terms)
+            specific_glossary = packed_glossary_section(self.glossary, [texts[i] for i in pending],
+                                                        [term_ids_list[i] for i in pending])
+
+        # Placeholders are numbered across the whole request so every segment can be checked
+        masked_texts = []
+        spans_list = []
+        offset = 0
+        for i in pending:
+            masked_text, spans = mask_spans(texts[i], offset) if Config.MASK_SPANS else (texts[i], [])
+            masked_texts.append(masked_text)
+            spans_list.append(spans)
+            offset += len(spans)
+        self.masked_spans += offset
+        packed_text = pack_segments(masked_texts)
+        response, model = await self._request(packed_text, specific_glossary, packed=True,
+                                              sources=[texts[i] for i in pending], masked=any(spans_list))
+
+        if is_failed_translation(response):
+            # The request itself gave up after retries; don't multiply that per block
+            for i in pending:
+                results[i] = response
+            return results
+
+        segments = split_segments(response, len(pending))
+        if segments is None:
+            logger.warning(f"Packed response did not split into {len(pending)} segments, falling back to per-block requests")
+            return None
+        offset = 0
+        for n, spans in enumerate(spans_list):
+            if spans:
+                segments[n] = unmask_spans(segments[n], spans, offset)
+                offset += len(spans)
+        if None in segments:
+            self.mask_fallbacks += 1
+            logger.warning("Packed response lost masked placeholders, falling back to per-block requests")
+            return None
+        for i, segment in zip(pending, segments):
+            results[i] = segment
+        return results
+
+    def _memory_lookup(self, text: str, specific_glossary: str = None) -> Optional[str]:
+        """
+        Return a remembered translation of `text` made with this prompt and glossary by
+        any model in the endpoint pool (in pool order), or None.
+        """
+        if not self.memory or self.refresh_memory:
+            return None
+        models = list(dict.fromkeys(endpoint.model for endpoint in self.pool.endpoints))
+        return self.memory.get_any([self.memory.make_key(text, model, Config.SYSTEM_PROMPT, specific_glossary)
+                                    for model in models])
+
+    def _memory_store(self, text: str, specific_glossary: str, result: str, model: str):
+        """Remember a translation under the model that actually produced it."""
+        if self.memory and model and not is_failed_translation(result):
+            key = self.memory.make_key(text, model, Config.SYSTEM_PROMPT, specific_glossary)
+            self.memory.put(key, text, result, model)
+
+    def _specific_glossary(self, text: str, use_glossary: bool = True, term_ids: List[int] = None) -> str:
+        """Format the glossary terms relevant to this text for the prompt, or None."""
+        if not (use_glossary and self.glossary):
+            return None
+        return glossary_section(self.glossary, text, term_ids)
+
+    async def _request_masked(self, text: str, specific_glossary: str = None) -> Reply:
+        """
+        Send one block with its untranslatable spans masked (MASK_SPANS) and put them
+        back into the translation. If a placeholder is lost or duplicated, the block is
+        sent again unmasked.
+        """
+        masked_text, spans = mask_spans(text) if Config.MASK_SPANS else (text, [])
+        if not spans:
+            return await self._request(text, specific_glossary)
+        self.masked_spans += len(spans)
+        result, model = await self._request(masked_text, specific_glossary, sources=[text], masked=True)
+        if is_failed_translation(result):
+            return result, model
+        restored = unmask_spans(result, spans)
+        if restored is not None:
+            return restored, model
+        self.mask_fallbacks += 1
+        logger.warning(f"Translation lost masked placeholders, re-sending unmasked: {text[:60]!r}")
+        return await self._request(text, specific_glossary)
+
+    async def _request(self, text: str, specific_glossary: str = None, packed: bool = False,
+                       sources: List[str] = None, masked: bool = False) -> Reply:
+        """
+        Send one translation request. With HEDGE_REQUESTS on, a request still running
+        after the observed p95 latency gets a duplicate, the first successful answer
+        wins and the other request is cancelled. A duplicate is only sent while a
+        concurrency slot is free and takes that slot in `_send`, so hedging stays
+        within the limit and never delays queued blocks.
+        """
+        if not self.hedger:
+            return await self._make_request(text, specific_glossary, packed, sources, masked, self.stream_timings)
+
+        kind = 'packed' if packed else 'single'
+        self.hedger.requests += 1
+        started = time.monotonic()
+        # Each copy keeps its stream timing apart, so only the answer that is used is sampled
+        timings = {}
+        primary = asyncio.create_task(self._make_request(text, specific_glossary, packed, sources, masked,
+                                                         timings.setdefault('primary', [])))
+        pending = {primary}
+        hedge = None
+        result = None
+        try:
+            delay = self.hedger.delay(kind)
+            if delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if pending and self.hedger.allow() and not self.semaphore.locked():
+                    self.hedger.hedges += 1
+                    logger.info(f"Request running for over {delay:.1f}s, sending a hedge")
+                    hedge = asyncio.create_task(self._make_request(text, specific_glossary, packed, sources, masked,
+                                                                   timings.setdefault('hedge', [])))
+                    pending.add(hedge)
+                elif done:
+                    pending = done
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not is_failed_translation(result[0]):
+                        if task is hedge:
+                            self.hedger.hedge_wins += 1
+                        self.stream_timings.extend(timings['hedge' if task is hedge else 'primary'])
+                        self.hedger.record(time.monotonic() - started, kind)
+                        return result
+            # Both gave up: report the last failure
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _make_request(self, text: str, specific_glossary: str = None, packed: bool = False,
+                            sources: List[str] = None, masked: bool = False, timings: list = None) -> Reply:
+        """
+        Returns the response and the model of the endpoint that answered.
+        `sources` are the blocks the request translates (default: `text`), for per-block usage;
+        `masked` adds the placeholder instruction to the prompt; a streamed answer's timing is
+        appended to `timings`.
+        """
+        payload = Config.get_payload(text, specific_glossary, packed=packed, masked=masked)
+        prompt_estimate = sum(estimate_tokens(message['content']) for message in payload['messages'])
+        estimated_tokens = prompt_estimate + int(estimate_tokens(text) * self.COMPLETION_TOKEN_RATIO)
+        glossary_tokens = estimate_tokens(specific_glossary) if specific_glossary else 0
+        sources = sources or [text]
+        self._reserve_budget(estimated_tokens)
+        try:
+            return await self._send(payload, estimated_tokens, prompt_estimate, glossary_tokens, sources, timings)
+        finally:
+            self._reserved_tokens -= estimated_tokens
+
+    def _reserve_budget(self, tokens: int):
+        if not self.token_budget:
+            return
+        committed = self.usage.total_tokens + self._reserved_tokens
+        if committed + tokens > self.token_budget:
+            raise TokenBudgetExceeded(f"Token budget of {self.token_budget} reached "
+                                      f"({self.usage.total_tokens} used, {self._reserved_tokens} in flight)")
+        self._reserved_tokens += tokens
+
+    async def _send(self, payload: dict, estimated_tokens: int, prompt_estimate: int, glossary_tokens: int,
+                    sources: List[str], timings: list = None) -> Reply:
+        retry = self.retry_policy.start()
         
-        payload = Config.get_payload(text, specific_glossary)
-        # Construct URL: assume BASE_URL is the root or the full path?
-        # Config says "Base URL + API Key". Usually BASE_URL is like "https://api.openai.com/v1"
-        # So we append "/chat/completions"
-        url = f"{self.base_url}/chat/completions"
+        while True:
+            # A 429 pauses its endpoint; while every endpoint is paused, wait outside the concurrency slot
+            pause = self.pool.pause_remaining()
+            if pause:
+                await asyncio.sleep(pause)
+            # The slot is held per attempt, so back-off between attempts doesn't occupy it
+            async with self.semaphore:
+                if self.pool.pause_remaining():
+                    # Paused while waiting for the slot: give it back and wait as above
+                    continue
+                await self.breaker.wait()
+                # Each attempt is routed separately, so a retry can land on a healthier endpoint
+                endpoint = await self.pool.acquire()
+                retry_after = None
+                sent = False
+                try:
+                    await endpoint.rate_limiter.acquire(estimated_tokens)
+                    started = time.monotonic()
+                    self.requests_sent += 1
+                    sent = True
+                    # Endpoint base URLs are like "https://api.openai.com/v1"; the URL appends "/chat/completions"
+                    async with self.session.post(endpoint.url, headers=endpoint.headers, json=dict(payload, model=endpoint.model),
+                                                 timeout=Config.TIMEOUT_SECONDS) as response:
+                            retry_after = endpoint.rate_limiter.update_from_headers(response.headers)
+                            if response.status == 200 and payload['stream']:
+                                content, usage, timing = await self._read_stream(response, started)
+                                if timing and timings is not None:
+                                    timings.append(dict(timing, blocks=len(sources)))
+                                self._record(AdaptiveLimiter.OK, time.monotonic() - started, endpoint)
+                                self.usage.record(endpoint.model, usage, time.monotonic() - started, sources,
+                                                  prompt_estimate, content or '', glossary_tokens)
+                                if usage.get('total_tokens'):
+                                    endpoint.rate_limiter.adjust(usage['total_tokens'] - estimated_tokens)
+                                if content is None:
+                                    logger.error("Stream ended without any content")
+                                    return "[Translation Error: Invalid Response]", None
+                                return content.strip(), endpoint.model
+                            elif response.status == 200:
+                                data = await response.json()
+                                self._record(AdaptiveLimiter.OK, time.monotonic() - started, endpoint)
+                                used_tokens = (data.get('usage') or {}).get('total_tokens')
+                                if used_tokens:
+                                    endpoint.rate_limiter.adjust(used_tokens - estimated_tokens)
+                                if 'choices' in data and len(data['choices']) > 0:
+                                    content = data['choices'][0]['message']['content']
+                                    self.usage.record(endpoint.model, data.get('usage'), time.monotonic() - started, sources,
+                                                      prompt_estimate, content, glossary_tokens)
+                                    return content.strip(), endpoint.model
+                                else:
+                                    logger.error(f"Unexpected response format: {data}")
+                                    return "[Translation Error: Invalid Response]", None
+                            elif response.status == 429:
+                                self._record(AdaptiveLimiter.THROTTLED, endpoint=endpoint)
+                                # A server-provided Retry-After already paused the endpoint's rate limiter
+                                error_class = RetryPolicy.THROTTLED
+                                logger.warning(f"Rate limit hit on {endpoint.name}")
+                            else:
+                                error_text = await response.text()
+                                logger.error(f"API Error {response.status} from {endpoint.name}: {error_text}")
+                                if 400 <= response.status < 500:
+                                    # The backend is up, the request itself is bad: not worth retrying
+                                    self.breaker.record_success()
+                                    return f"[Translation Error: {response.status}]", None
+                                self._record(AdaptiveLimiter.ERROR, endpoint=endpoint)
+                                error_class = RetryPolicy.SERVER_ERROR
+                except asyncio.CancelledError:
+                    if sent:
+                        # A hedge loser (or a stopped run): its prompt was sent and may be billed
+                        self.usage.record_cancelled(endpoint.model, sources, prompt_estimate)
+                    raise
+                except asyncio.TimeoutError:
+                    self._record(AdaptiveLimiter.ERROR, endpoint=endpoint)
+                    error_class = RetryPolicy.TIMEOUT
+                    logger.warning(f"Timeout on attempt {retry.attempts + 1} ({endpoint.name})")
+                except Exception as e:
+                    self._record(AdaptiveLimiter.ERROR, endpoint=endpoint)
+                    error_class = RetryPolicy.NETWORK
+                    logger.error(f"Request to {endpoint.name} failed: {e}")
+                finally:
+                    self.pool.release(endpoint)
+            
+            delay = retry.next_delay(error_class, retry_after)
+            if delay is None:
+                break
+            if error_class == RetryPolicy.THROTTLED:
+                # Pause the endpoint for every request; the retry goes to an endpoint that isn't paused,
+                # or waits for the pause at the top of the loop
+                endpoint.rate_limiter.pause(delay)
+                logger.warning(f"Retrying {error_class}, {endpoint.name} paused for {delay:.1f}s (attempt {retry.attempts + 1})")
+                continue
+            logger.warning(f"Retrying {error_class} in {delay:.1f}s (attempt {retry.attempts + 1})")
+            await asyncio.sleep(delay)
         
-        for attempt in range(Config.RETRY_ATTEMPTS):
+        return "[Translation Failed]", None
+
+    async def _read_stream(self, response, started: float):
+        """
+        Assemble a streamed (SSE) completion from its deltas. Returns (content, usage, timing);
+        content and timing are None if no delta arrived. Raises asyncio.TimeoutError when the first
+        token takes longer than FIRST_TOKEN_TIMEOUT, or the stream then stalls for
+        INTER_TOKEN_TIMEOUT, so the request is retried without waiting out TIMEOUT_SECONDS.
+        """
+        parts = []
+        usage = {}
+        first_token_at = None
+        while True:
+            if first_token_at is None:
+                timeout = Config.FIRST_TOKEN_TIMEOUT - (time.monotonic() - started)
+            else:
+                timeout = Config.INTER_TOKEN_TIMEOUT
             try:
-                async with self.session.post(url, headers=self.headers, json=payload, timeout=Config.TIMEOUT_SECONDS) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if 'choices' in data and len(data['choices']) > 0:
-                                return data['choices'][0]['message']['content'].strip()
-                            else:
-                                logger.error(f"Unexpected response format: {data}")
-                                return "[Translation Error: Invalid Response]"
-                        elif response.status == 429:
-                            wait_time = 2 ** attempt
-                            logger.warning(f"Rate limit hit. Retrying in {wait_time}s...")
-                            await asyncio.sleep(wait_time)
-                        else:
-                            error_text = await response.text()
-                            logger.error(f"API Error {response.status}: {error_text}")
-                            if 400 <= response.status < 500:
-                                return f"[Translation Error: {response.status}]"
-                            # Retry on 5xx
-                            await asyncio.sleep(1)
+                line = await asyncio.wait_for(response.content.readline(), max(timeout, 0))
             except asyncio.TimeoutError:
-                logger.warning(f"Timeout on attempt {attempt + 1}")
-            except Exception as e:
-                logger.error(f"Request failed: {e}")
-                await asyncio.sleep(1)
-        
-        return "[Translation Failed]"
+                waiting_for = "first token" if first_token_at is None else "next token"
+                logger.warning(f"Stream stalled waiting for the {waiting_for}")
+                raise
+            if not line:
+                break
+            line = line.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            usage = chunk.get('usage') or usage
+            for choice in chunk.get('choices') or []:
+                delta = (choice.get('delta') or {}).get('content')
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    parts.append(delta)
+
+        if first_token_at is None:
+            return None, usage, None
+        content = ''.join(parts)
+        generation_time = time.monotonic() - first_token_at
+        completion_tokens = usage.get('completion_tokens') or estimate_tokens(content)
+        timing = {
+            'ttft': first_token_at - started,
+            'tokens_per_sec': completion_tokens / generation_time if generation_time > 0.001 else None
+        }
+        return content, usage, timing
+
+    def streaming_stats(self) -> Optional[dict]:
+        """
+        Time-to-first-token and generation speed per streamed HTTP request (not per block:
+        a packed request is one sample for all of its blocks), over the answers that were used.
+        """
+        if not self.stream_timings:
+            return None
+        ttfts = sorted(timing['ttft'] for timing in self.stream_timings)
+        rates = [timing['tokens_per_sec'] for timing in self.stream_timings if timing['tokens_per_sec']]
+        return {
+            'requests': len(ttfts),
+            'blocks': sum(timing['blocks'] for timing in self.stream_timings),
+            'ttft_p50': round(ttfts[len(ttfts) // 2], 3),
+            'ttft_max': round(ttfts[-1], 3),
+            'tokens_per_sec_mean': round(sum(rates) / len(rates), 1) if rates else None
+        }
+
+    def _record(self, outcome: str, latency: float = None, endpoint: Endpoint = None):
+        """Report a request outcome to the endpoint pool, circuit breaker and adaptive limiter (if enabled)."""
+        if endpoint:
+            self.pool.report(endpoint, outcome)
+        # A 429 still proves the backend is reachable
+        if outcome == AdaptiveLimiter.ERROR:
+            if self.pool.all_failing():
+                self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if isinstance(self.semaphore, AdaptiveLimiter):
+            self.semaphore.record(outcome, latency)
+
+    @property
+    def max_concurrency(self) -> int:
+        """Upper bound on concurrent requests, i.e. how many workers can be kept busy."""
+        if isinstance(self.semaphore, AdaptiveLimiter):
+            return self.semaphore.max_limit
+        return Config.MAX_CONCURRENCY
+
+    @property
+    def concurrency_limit(self) -> int:
+        """Current number of concurrent requests allowed."""
+        if isinstance(self.semaphore, AdaptiveLimiter):
+            return self.semaphore.current_limit
+        return Config.MAX_CONCURRENCY
 
     async def close(self):
+        await self.pool.close()
         if self.session:
             await self.session.close()
 
@@ -0,0 +1,187 @@
+from typing import Any, Dict, List, Optional
+from core.tokens import estimate_tokens
+
+def parse_prices(spec: str) -> Dict[str, Dict[str, float]]:
+    """
+    Parse "gpt-4o-mini=0.15/0.6/0.075,deepseek-chat=0.27/1.1" into per-model prices
+    in USD per million tokens: prompt / completion / cached prompt (defaults to prompt).
+    """
+    prices = {}
+    for item in (spec or '').split(','):
+        if item.strip():
+            model, _, values = item.partition('=')
+            parts = [float(value) for value in values.split('/')]
+            prices[model.strip()] = {
+                'prompt': parts[0],
+                'completion': parts[1] if len(parts) > 1 else parts[0],
+                'cached': parts[2] if len(parts) > 2 else parts[0]
+            }
+    return prices
+
+class TokenBudgetExceeded(Exception):
+    """Raised instead of sending a request that could take usage past the token budget."""
+
+def percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def _empty_counts() -> Dict[str, int]:
+    return {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+
+class UsageTracker:
+    """
+    Token usage, latency and cost of translation requests.
+
+    Usage comes from the `usage` field of each response; responses without one
+    are counted from token estimates and flagged as `estimated_requests`.
+    Requests cancelled after they were sent (hedge losers) count their
+    estimated prompt tokens as `cancelled_requests`.
+    Tokens are attributed to the source blocks of the request (split by their
+    size for packed requests), and `glossary_tokens` estimates how much of the
+    prompt was injected glossary. Everything is counted under the current
+    `stage`, so a --retry-failed pass is reported separately.
+    """
+
+    def __init__(self, prices: Dict[str, Dict[str, float]] = None, stage: str = 'translate'):
+        self.prices = prices or {}
+        self.stage = stage
+        self.stages = {}
+        self.models = {}
+        self.block_tokens = {}
+        self.latencies = []
+
+    def record(self, model: str, usage: Optional[dict], latency: float, sources: List[str],
+               prompt_estimate: int = 0, completion: str = '', glossary_tokens: int = 0):
+        """Count one completed request."""
+        usage = usage or {}
+        estimated = not usage.get('prompt_tokens')
+        prompt_tokens = usage.get('prompt_tokens') or prompt_estimate
+        completion_tokens = usage.get('completion_tokens') or estimate_tokens(completion)
+        # OpenAI-style prompt_tokens_details.cached_tokens, or DeepSeek-style prompt_cache_hit_tokens
+        details = usage.get('prompt_tokens_details') or {}
+        cached_tokens = details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or 0
+
+        stage = self._stage_counts()
+        model_counts = self.models.setdefault(model, _empty_counts())
+        for counts in (stage, model_counts):
+            counts['requests'] += 1
+            counts['prompt_tokens'] += prompt_tokens
+            counts['completion_tokens'] += completion_tokens
+            counts['cached_tokens'] += cached_tokens
+        stage['glossary_tokens'] += glossary_tokens
+        stage['estimated_requests'] += estimated
+        self.latencies.append(latency)
+        self._attribute(prompt_tokens + completion_tokens, sources)
+
+    def record_cancelled(self, model: str, sources: List[str], prompt_estimate: int):
+        """
+        Count a request cancelled after it was sent. The provider may still bill its
+        prompt, so the estimate counts towards usage and the token budget.
+        """
+        stage = self._stage_counts()
+        stage['prompt_tokens'] += prompt_estimate
+        stage['cancelled_requests'] = stage.get('cancelled_requests', 0) + 1
+        self.models.setdefault(model, _empty_counts())['prompt_tokens'] += prompt_estimate
+        self._attribute(prompt_estimate, sources)
+
+    def _stage_counts(self) -> Dict[str, int]:
+        return self.stages.setdefault(self.stage, dict(_empty_counts(), glossary_tokens=0, estimated_requests=0))
+
+    def _attribute(self, total: int, sources: List[str]):
+        """Split `total` tokens between the source blocks by their size."""
+        weights = [max(1, estimate_tokens(source)) for source in sources]
+        for source, weight in zip(sources, weights):
+            self.block_tokens[source] = self.block_tokens.get(source, 0) + round(total * weight / sum(weights))
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(stage['prompt_tokens'] for stage in self.stages.values())
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(stage['prompt_tokens'] + stage['completion_tokens'] for stage in self.stages.values())
+
+    @property
+    def cached_tokens(self) -> int:
+        return sum(stage['cached_tokens'] for stage in self.stages.values())
+
+    def cost(self, model: str, counts: Dict[str, int]) -> Optional[float]:
+        """Cost in USD of `counts` at the model's prices, or None when it has no price."""
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        uncached = counts['prompt_tokens'] - counts['cached_tokens']
+        return (uncached * price['prompt'] + counts['cached_tokens'] * price['cached']
+                + counts['completion_tokens'] * price['completion']) / 1_000_000
+
+    def per_block(self, texts: List[str]) -> List[int]:
+        """
+        Tokens spent on each block. Repeated blocks share one request, which is
+        attributed to their first occurrence.
+        """
+        remaining = dict(self.block_tokens)
+        return [remaining.pop(text, 0) for text in texts]
+
+    def summary(self) -> Dict[str, Any]:
+        models = {}
+        for model, counts in self.models.items():
+            models[model] = dict(counts)
+            cost = self.cost(model, counts)
+            if cost is not None:
+                models[model]['cost_usd'] = round(cost, 4)
+        summary = {'stages': {name: dict(counts) for name, counts in self.stages.items()}, 'models': models}
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            summary['latency'] = {
+                'p50': round(percentile(ordered, 50), 3),
+                'p90': round(percentile(ordered, 90), 3),
+                'p99': round(percentile(ordered, 99), 3),
+                'max': round(ordered[-1], 3)
+            }
+        costs = [model['cost_usd'] for model in models.values() if 'cost_usd' in model]
+        if costs:
+            summary['cost_usd'] = round(sum(costs), 4)
+        return summary
+
+def merge_summaries(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add a run's usage summary to the one saved in the pipeline state, so a
+    resumed or retried file reports what it cost in total. Latency percentiles
+    are those of the latest run.
+    """
+    if not previous:
+        return current
+    merged = {'stages': {}, 'models': {}}
+    for section in ('stages', 'models'):
+        for source in (previous.get(section, {}), current.get(section, {})):
+            for name, counts in source.items():
+                target = merged[section].setdefault(name, {})
+                for key, value in counts.items():
+                    target[key] = round(target.get(key, 0) + value, 4)
+    if 'latency' in current or 'latency' in previous:
+        merged['latency'] = current.get('latency') or previous['latency']
+    costs = [model['cost_usd'] for model in merged['models'].values() if 'cost_usd' in model]
+    if costs:
+        merged['cost_usd'] = round(sum(costs), 4)
+    return merged
+
+def format_summary(summary: Dict[str, Any]) -> List[str]:
+    """Human-readable lines for a usage summary (used by main.py and batch_runner.py)."""
+    lines = []
+    for name, counts in summary.get('stages', {}).items():
+        line = (f"{name}: {counts['requests']} requests, {counts['prompt_tokens']} prompt tokens "
+                f"({counts['cached_tokens']} cached, ~{counts['glossary_tokens']} glossary), "
+                f"{counts['completion_tokens']} completion tokens")
+        if counts['estimated_requests']:
+            line += f" ({counts['estimated_requests']} requests without reported usage were estimated)"
+        if counts.get('cancelled_requests'):
+            line += f" (includes the estimated prompts of {counts['cancelled_requests']} cancelled requests)"
+        lines.append(line)
+    for model, counts in summary.get('models', {}).items():
+        if 'cost_usd' in counts:
+            lines.append(f"{model}: ${counts['cost_usd']:.4f}")
+    latency = summary.get('latency')
+    if latency:
+        lines.append(f"latency p50 {latency['p50']}s, p90 {latency['p90']}s, p99 {latency['p99']}s, max {latency['max']}s")
+    if 'cost_usd' in summary:
+        lines.append(f"total cost ${summary['cost_usd']:.4f}")
+    return lines
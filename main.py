@@ -1,13 +1,25 @@
 import asyncio
 import argparse
 import sys
+import time
+from dataclasses import asdict
 from datetime import datetime
 from pathlib import Path
-from tqdm.asyncio import tqdm as tqdm_asyncio
 from config import Config
 from core.parser import PDFParser
-from core.processor import MarkdownProcessor, ContentBlock
+from core.processor import MarkdownProcessor, deserialize_blocks, serialize_blocks
 from core.translator import Translator
+from core.dispatch import translate_blocks
+from core.limiter import AdaptiveLimiter
+from core.journal import TranslationJournal
+from core.quality import find_retry_candidates
+from core.classifier import mark_passthrough, parse_categories
+from core.chunker import Chunk, fold_translations, rechunk
+from core.tokens import estimate_tokens
+from core.usage import TokenBudgetExceeded, format_summary, merge_summaries
+from core.estimate import estimate_translation, format_estimate
+from core.glossary import GlossaryLoader
+from core.memory import TranslationMemory
 from core.epub import EpubGenerator
 from core.pdf import PDFGenerator
 from core.state import PipelineState
@@ -44,13 +56,35 @@ async def main():
     parser.add_argument("--preset", default="all", choices=list(Config.PIPELINE_PRESETS.keys()), help="Pipeline preset to run")
     parser.add_argument("--steps", help="Specific steps to run (e.g., '0-4' or '5-8')")
     parser.add_argument("--resume", action="store_true", help="Resume from saved state")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-translate only failed or suspicious blocks of a saved run, then rebuild the output")
     parser.add_argument("--check", action="store_true", help="Check completed steps from state file")
+    parser.add_argument("--estimate", action="store_true", help="Prepare the document (steps up to 4.1) and estimate Step 5's requests, tokens, cost and time without translating")
+    parser.add_argument("--token-budget", type=int, help="Stop translating before this many tokens are used (overrides TOKEN_BUDGET)")
     parser.add_argument("--state-file", help="Path to state file (default: {output_dir}/pipeline_state.json")
     parser.add_argument("--format", choices=['epub', 'pdf'], default='epub', help="Output format (epub or pdf)")
     
     args = parser.parse_args()
 
-async def process_single_file(input_file, output_dir=None, preset='all', steps=None, resume=False, check=False, state_file=None, output_format='epub'):
+def translation_texts(blocks, state):
+    """Texts sent for translation: the Step 4 chunks if re-chunking changed anything, else the text blocks."""
+    if state.get('chunks'):
+        return [chunk['text'] for chunk in state['chunks']]
+    return [b.content for b in blocks if b.type == 'text']
+
+def save_usage(state, usage, texts):
+    """Print a run's token usage and add it to the state; usage adds up over resumed and retried runs."""
+    usage_summary = usage.summary()
+    for line in format_summary(usage_summary):
+        print(f"🧾 {line}")
+    state['usage'] = merge_summaries(state.get('usage'), usage_summary)
+    block_tokens = usage.per_block(texts)
+    previous_tokens = state.get('block_tokens') or []
+    if len(previous_tokens) == len(block_tokens):
+        block_tokens = [a + b for a, b in zip(previous_tokens, block_tokens)]
+    state['block_tokens'] = block_tokens
+
+async def process_single_file(input_file, output_dir=None, preset='all', steps=None, resume=False, check=False, state_file=None, output_format='epub', retry_failed=False,
+                              estimate=False, token_budget=None):
     """
     Process a single PDF file through the translation pipeline.
     
@@ -63,6 +97,15 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
         check (bool, optional): Check completed steps. Defaults to False.
         state_file (str, optional): Path to state file.
         output_format (str, optional): Output format ('epub' or 'pdf'). Defaults to 'epub'.
+        retry_failed (bool, optional): Re-send only failed or suspicious translations from the saved
+            state, then re-run merge/reconstruct/output (steps 5-8 unless `steps` is given). Defaults to False.
+        estimate (bool, optional): Run the preparation steps only (up to 4.1) and report the expected
+            requests, tokens, cost and wall time of Step 5 instead of translating. Defaults to False.
+        token_budget (int, optional): Token budget for Step 5, overriding Config.TOKEN_BUDGET.
+            When it would be exceeded, translation stops and TokenBudgetExceeded is raised.
+
+    Returns:
+        dict: The pipeline state of the run (None with `check` or when the pipeline stops early).
     """
     # Override config if output dir is specified
     if output_dir:
@@ -71,11 +114,18 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
     if output_format:
         Config.OUTPUT_FORMAT = output_format
     
+    if retry_failed:
+        resume = True
+        steps = steps or '5-8'
+    
     # Configure pipeline steps
     if steps:
         Config.enable_steps(steps)
     else:
         Config.apply_preset(preset)
+    if estimate:
+        for step in ('translate', 'merge_translations', 'reconstruct_markdown', 'generate_output'):
+            Config.PIPELINE_STEPS[step] = False
     
     input_path = Path(input_file)
     
@@ -118,6 +168,8 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
             state = state_manager.load()
             if not state:
                 print("⚠️  No saved state found. Starting from beginning.")
+        # Tokens Step 5 spends in this invocation (stays 0 when it does not run), for budgets across files
+        state['run_tokens'] = 0
         
         print(f"🚀 Starting pipeline for: {input_file}")
         print(f"📋 Active steps: {[step for step, active in Config.PIPELINE_STEPS.items() if active]}")
@@ -128,7 +180,7 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
         
         # Restore blocks from state if available
         if 'blocks' in state:
-            blocks = [ContentBlock(**b) for b in state['blocks']]
+            blocks = deserialize_blocks(state['blocks'])
             print(f"📂 Restored {len(blocks)} blocks from state")
         
         # Step 0: Prepare paths
@@ -183,23 +235,28 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
         if Config.PIPELINE_STEPS.get('read_markdown'):
             if not blocks:  # Only read if not loaded from state
                 print("▶️  Step 2: Reading Markdown...")
-                text = processor.load_markdown(md_file)
-                state['markdown_text'] = text
+                if not Path(md_file).exists():
+                    print(f"❌ Error: Markdown file not found: {md_file}")
+                    return
+                # The markdown is streamed from disk by Step 3, so only its path is kept
+                state.pop('markdown_text', None)
+                state['md_file'] = str(md_file)
+                print(f"✅ Markdown ready: {md_file} ({Path(md_file).stat().st_size / 1e6:.1f} MB)")
                 state['last_completed_step'] = 'read_markdown'
                 state_manager.save(state)
             else:
                 print("⏭️  Skipping Step 2: Using cached data")
         else:
             print("⏭️  Skipping Step 2: Read Markdown")
-            text = state.get('markdown_text') or processor.load_markdown(md_file)
         
         # Step 3: Parse Markdown
         if Config.PIPELINE_STEPS.get('parse_markdown'):
             if not blocks:
                 print("▶️  Step 3: Parsing Markdown...")
-                blocks = processor.parse(text)
+                blocks = processor.parse(Path(md_file))
                 print(f"✅ Found {len(blocks)} blocks.")
-                state['blocks'] = [{'type': b.type, 'content': b.content, 'original': b.original, 'translation': b.translation} for b in blocks]
+                state.pop('chunks', None)
+                state['blocks'] = serialize_blocks(blocks)
                 state['last_completed_step'] = 'parse_markdown'
                 state_manager.save(state)
             else:
@@ -210,23 +267,59 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
         # Step 4: Identify text blocks
         if Config.PIPELINE_STEPS.get('identify_text_blocks'):
             print("▶️  Step 4: Identifying text blocks...")
+            skipped = mark_passthrough(blocks, parse_categories(Config.SKIP_CATEGORIES))
             text_blocks = [b for b in blocks if b.type == 'text']
             print(f"✅ Identified {len(text_blocks)} text blocks for translation.")
+            if skipped:
+                print(f"🚫 Passing through {sum(skipped.values())} blocks untranslated: "
+                      + ", ".join(f"{count} {category}" for category, count in skipped.items()))
+            chunks = rechunk(blocks, Config.CHUNK_TARGET_TOKENS, Config.CHUNK_MAX_TOKENS)
+            if any(chunk.part is not None or len(chunk.blocks) > 1 for chunk in chunks):
+                merged = sum(1 for chunk in chunks if len(chunk.blocks) > 1)
+                split = len({chunk.blocks[0] for chunk in chunks if chunk.part is not None})
+                sizes = sorted(estimate_tokens(chunk.text) for chunk in chunks)
+                print(f"🧩 Re-chunked {len(text_blocks)} text blocks into {len(chunks)} chunks "
+                      f"({merged} merged, {split} oversize blocks split): "
+                      f"median {sizes[len(sizes) // 2]} tokens, max {sizes[-1]}")
+                state['chunks'] = [asdict(chunk) for chunk in chunks]
+            else:
+                state.pop('chunks', None)
+            state['blocks'] = serialize_blocks(blocks)
             state['text_block_count'] = len(text_blocks)
+            state['skipped_blocks'] = skipped
             state['last_completed_step'] = 'identify_text_blocks'
             state_manager.save(state)
         else:
             print("⏭️  Skipping Step 4: Identify text blocks")
         
-        # Step 4.1: Load glossary
+        # Step 4.1: Load glossary and pre-scan text blocks for glossary terms
         glossary_path = None
         if Config.PIPELINE_STEPS.get('load_glossary'):
             print("▶️  Step 4.1: Loading glossary...")
             if Config.GLOSSARY_FILENAME:
                 glossary_path = Path(Config.ASSETS_DIR) / Config.GLOSSARY_FILENAME
                 if glossary_path.exists():
-                    print(f"✅ Glossary loaded: {glossary_path}")
+                    glossary = GlossaryLoader(str(glossary_path))
+                    print(f"✅ Glossary loaded: {glossary_path} ({len(glossary)} terms)")
                     state['glossary_path'] = str(glossary_path)
+                    
+                    if blocks:
+                        texts = translation_texts(blocks, state)
+                        scan_start = time.perf_counter()
+                        block_terms, term_frequencies = glossary.prescan(texts)
+                        scan_time = time.perf_counter() - scan_start
+                        hit_count = sum(term_frequencies.values())
+                        print(f"✅ Pre-scanned {len(texts)} text blocks in {scan_time:.2f}s: "
+                              f"{hit_count} term hits, {len(term_frequencies)} distinct terms")
+                        top_terms = ", ".join(f"{term} ({count})" for term, count in list(term_frequencies.items())[:5])
+                        if top_terms:
+                            print(f"   Most frequent: {top_terms}")
+                        state['glossary_fingerprint'] = glossary.fingerprint
+                        state['glossary_terms'] = block_terms
+                        state['glossary_term_frequencies'] = term_frequencies
+                    else:
+                        print("⚠️  No blocks available, glossary terms will be matched during translation")
+                    
                     state['last_completed_step'] = 'load_glossary'
                     state_manager.save(state)
                 else:
@@ -239,23 +332,155 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
             print("⏭️  Skipping Step 4.1: Load glossary")
             glossary_path = state.get('glossary_path')
 
+        if estimate:
+            if not blocks:
+                print("❌ Error: No blocks to estimate. Run Steps 0-3 first.")
+                return
+            texts = translation_texts(blocks, state)
+            glossary = GlossaryLoader(str(glossary_path)) if glossary_path and Path(glossary_path).exists() else None
+            block_terms = state.get('glossary_terms')
+            if not glossary or state.get('glossary_fingerprint') != glossary.fingerprint:
+                block_terms = None
+            translation_estimate = estimate_translation(texts, glossary, block_terms)
+            print("🧮 Estimate for Step 5 (cold translation memory):")
+            for line in format_estimate(translation_estimate):
+                print(f"   {line}")
+            budget = Config.TOKEN_BUDGET if token_budget is None else token_budget
+            if budget and translation_estimate['total_tokens'] > budget:
+                print(f"⚠️  Exceeds the token budget of {budget}: Step 5 would stop before finishing")
+            state['estimate'] = translation_estimate
+            state_manager.save(state)
+            return state
+
         # Step 5: Translate
         if Config.PIPELINE_STEPS.get('translate'):
             print("▶️  Step 5: Translating...")
-            translator = Translator(str(glossary_path) if glossary_path else None)
-            text_blocks = [b for b in blocks if b.type == 'text']
-            print(f"   Translating {len(text_blocks)} text blocks...")
+            texts = translation_texts(blocks, state)
+            if retry_failed and len(state.get('translations') or []) != len(texts):
+                print("❌ Error: No saved translations matching the text blocks. Run Step 5 first.")
+                return
+            memory = TranslationMemory(Config.TM_PATH, Config.TM_MAX_SIZE_MB) if Config.TM_ENABLED else None
+            # When retrying, bad outputs may be cached in the memory too: bypass and overwrite them
+            translator = Translator(str(glossary_path) if glossary_path else None, memory=memory, refresh_memory=retry_failed,
+                                    token_budget=token_budget)
+            if retry_failed:
+                translator.usage.stage = 'retry'
+            print(f"   Translating {len(texts)} text blocks...")
+            
+            # Use the Step 4.1 pre-scan if it was made against this exact glossary
+            block_terms = state.get('glossary_terms')
+            if (not translator.glossary or not block_terms or len(block_terms) != len(texts)
+                    or state.get('glossary_fingerprint') != translator.glossary.fingerprint):
+                block_terms = [None] * len(texts)
+            
+            # Finished blocks are journaled as they land so an interrupted run can resume
+            journal = TranslationJournal(state_path.with_name(f"{state_path.stem}.journal.jsonl"))
+            if resume:
+                done = journal.load(texts)
+                if done:
+                    print(f"📒 Resuming: {len(done)} of {len(texts)} blocks already translated in {journal.path}")
+            else:
+                journal.reset()
+                done = {}
+            
+            if retry_failed:
+                previous = [done.get(i, translation) for i, translation in enumerate(state['translations'])]
+                candidates = find_retry_candidates(texts, previous)
+                done = {i: translation for i, translation in enumerate(previous) if i not in candidates}
+                reasons = {}
+                for reason in candidates.values():
+                    reasons[reason] = reasons.get(reason, 0) + 1
+                print(f"🔁 Retrying {len(candidates)} of {len(texts)} blocks: "
+                      + (", ".join(f"{count} {reason}" for reason, count in reasons.items()) or "nothing to retry"))
             
             try:
-                tasks = [translator.translate(b.content) for b in text_blocks]
-                translations = await tqdm_asyncio.gather(*tasks, desc="Translating", unit="block")
+                translations, dispatch_stats = await translate_blocks(
+                    translator, texts, block_terms, done=done,
+                    on_result=lambda i, translation: journal.record(i, texts[i], translation)
+                )
+                if dispatch_stats['deduplicated']:
+                    print(f"♻️  Deduplicated {dispatch_stats['deduplicated']} repeated blocks: "
+                          f"{dispatch_stats['requests']} requests for {dispatch_stats['blocks']} blocks")
+                if dispatch_stats['packed_requests']:
+                    print(f"📦 Packed blocks into {dispatch_stats['packed_requests']} multi-block requests "
+                          f"({dispatch_stats['pack_fallbacks']} fell back to per-block requests)")
+                if isinstance(translator.semaphore, AdaptiveLimiter):
+                    limiter_stats = translator.semaphore.stats()
+                    print(f"🎚️  Adaptive concurrency: final limit {limiter_stats['limit']}, peak {limiter_stats['peak_limit']} "
+                          f"(bounds {limiter_stats['min_limit']}-{limiter_stats['max_limit']}), outcomes {limiter_stats['outcomes']}")
+                    dispatch_stats['concurrency'] = limiter_stats
+                streaming_stats = translator.streaming_stats()
+                if streaming_stats:
+                    print(f"📡 Streaming, per request ({streaming_stats['requests']} requests for {streaming_stats['blocks']} blocks): "
+                          f"time to first token p50 {streaming_stats['ttft_p50']}s (max {streaming_stats['ttft_max']}s), "
+                          f"{streaming_stats['tokens_per_sec_mean']} tokens/s on average")
+                    dispatch_stats['streaming'] = streaming_stats
+                usage = translator.usage
+                if usage.cached_tokens:
+                    print(f"🗄️  Prompt cache: {usage.cached_tokens} of {usage.prompt_tokens} prompt tokens served from cache "
+                          f"({usage.cached_tokens / usage.prompt_tokens:.0%}, layout '{Config.PROMPT_LAYOUT}')")
+                if translator.hedger:
+                    hedge_stats = translator.hedger.stats()
+                    print(f"🏁 Hedging: {hedge_stats['hedges']} hedges for {hedge_stats['requests']} requests "
+                          f"({hedge_stats['hedge_fraction']:.1%}), hedge answered first {hedge_stats['hedge_wins']} times")
+                    dispatch_stats['hedging'] = hedge_stats
+                if translator.breaker.times_opened:
+                    breaker_stats = translator.breaker.stats()
+                    print(f"🔌 Circuit breaker opened {breaker_stats['times_opened']} times, "
+                          f"requests paused for {breaker_stats['outage_seconds']:.1f}s in total")
+                    dispatch_stats['circuit_breaker'] = breaker_stats
+                if translator.pool.rate_limit_wait:
+                    print(f"⏳ Rate limiter held requests back for {translator.pool.rate_limit_wait:.1f}s in total")
+                    dispatch_stats['rate_limit_wait_seconds'] = round(translator.pool.rate_limit_wait, 2)
+                if len(translator.pool.endpoints) > 1:
+                    endpoint_stats = translator.pool.stats()
+                    for name, stats in endpoint_stats.items():
+                        print(f"🔀 {name}: {stats['requests']} requests, outcomes {stats['outcomes']}, {stats['ejections']} ejections")
+                    dispatch_stats['endpoints'] = endpoint_stats
+                if translator.masked_spans:
+                    print(f"🎭 Masked {translator.masked_spans} formulas, code spans, links and tags; "
+                          f"{translator.mask_fallbacks} responses lost a placeholder and were re-sent")
+                    dispatch_stats['masked_spans'] = translator.masked_spans
+                    dispatch_stats['mask_fallbacks'] = translator.mask_fallbacks
+                if memory:
+                    print(f"🧠 Translation memory: {memory.hits} hits, {memory.misses} misses")
+                
+                remaining = find_retry_candidates(texts, translations)
+                if remaining:
+                    print(f"⚠️  {len(remaining)} blocks failed or look suspicious; rerun with --retry-failed to re-send only those")
+                dispatch_stats['suspicious'] = len(remaining)
+                
+                save_usage(state, usage, texts)
+                dispatch_stats['tokens'] = usage.total_tokens
+                state['run_tokens'] = usage.total_tokens
                 
                 state['translations'] = translations
+                state['translate_stats'] = dispatch_stats
                 state['last_completed_step'] = 'translate'
                 state_manager.save(state)
+                journal.reset()
                 print("✅ Translation complete.")
+            except TokenBudgetExceeded as e:
+                # Keep what was spent so far; the next run adds to it
+                save_usage(state, translator.usage, texts)
+                state['run_tokens'] = translator.usage.total_tokens
+                state_manager.save(state)
+                print(f"\n🛑 {e}. Finished blocks are saved in {journal.path}; "
+                      f"raise TOKEN_BUDGET and rerun with --resume to translate the remaining ones.")
+                raise
+            except asyncio.CancelledError:
+                # Tokens spent before the interrupt count towards the file's totals too
+                save_usage(state, translator.usage, texts)
+                state['run_tokens'] = translator.usage.total_tokens
+                state_manager.save(state)
+                print(f"\n⏸️  Translation interrupted. Finished blocks are saved in {journal.path}; "
+                      f"rerun with --resume to translate only the remaining ones.")
+                raise
             finally:
+                journal.close()
                 await translator.close()
+                if memory:
+                    memory.close()
         else:
             print("⏭️  Skipping Step 5: Translation")
             translations = state.get('translations', [])
@@ -263,11 +488,15 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
         # Step 6: Merge translations
         if Config.PIPELINE_STEPS.get('merge_translations'):
             print("▶️  Step 6: Merging translations...")
+            if state.get('chunks'):
+                # Merged chunks are translated after their last block, split blocks are joined up again
+                chunks = [Chunk(**chunk) for chunk in state['chunks']]
+                translations = fold_translations(chunks, translations, sum(1 for b in blocks if b.type == 'text'))
             processor.inject_translations(blocks, translations)
             print("✅ Translations merged into blocks.")
             
             # Save updated blocks with translations
-            state['blocks'] = [{'type': b.type, 'content': b.content, 'original': b.original, 'translation': b.translation} for b in blocks]
+            state['blocks'] = serialize_blocks(blocks)
             state['last_completed_step'] = 'merge_translations'
             state_manager.save(state)
         else:
@@ -346,7 +575,10 @@ async def process_single_file(input_file, output_dir=None, preset='all', steps=N
         print("\n🎉 Pipeline completed!")
         print(f"📊 Last completed step: {state.get('last_completed_step', 'none')}") 
         print(f"📝 Log file: {log_file}")
+        return state
         
+    except TokenBudgetExceeded:
+        raise
     except Exception as e:
         print(f"\n❌ Pipeline failed with error: {e}")
         import traceback
@@ -366,7 +598,10 @@ async def main():
     parser.add_argument("--preset", default="all", choices=list(Config.PIPELINE_PRESETS.keys()), help="Pipeline preset to run")
     parser.add_argument("--steps", help="Specific steps to run (e.g., '0-4' or '5-8')")
     parser.add_argument("--resume", action="store_true", help="Resume from saved state")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-translate only failed or suspicious blocks of a saved run, then rebuild the output")
     parser.add_argument("--check", action="store_true", help="Check completed steps from state file")
+    parser.add_argument("--estimate", action="store_true", help="Prepare the document (steps up to 4.1) and estimate Step 5's requests, tokens, cost and time without translating")
+    parser.add_argument("--token-budget", type=int, help="Stop translating before this many tokens are used (overrides TOKEN_BUDGET)")
     parser.add_argument("--state-file", help="Path to state file (default: {output_dir}/pipeline_state.json")
     parser.add_argument("--format", choices=['epub', 'pdf'], default='epub', help="Output format (epub or pdf)")
     
@@ -380,8 +615,16 @@ async def main():
         resume=args.resume,
         check=args.check,
         state_file=args.state_file,
-        output_format=args.format
+        output_format=args.format,
+        retry_failed=args.retry_failed,
+        estimate=args.estimate,
+        token_budget=args.token_budget
     )
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except TokenBudgetExceeded:
+        sys.exit(1)
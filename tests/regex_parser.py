@@ -0,0 +1,104 @@
+"""
+Reference markdown parser: the original four-regexes-per-line implementation.
+
+MarkdownProcessor.iter_blocks classifies lines by their first character instead;
+tests/test_processor.py and benchmarks/bench_parse.py check that both produce the
+same blocks.
+"""
+import os
+import re
+from typing import Iterable, Iterator, Union
+from core.processor import ContentBlock, MarkdownProcessor
+
+
+def _text_block(content_lines) -> Iterator[ContentBlock]:
+    text = '\n'.join(content_lines)
+    if text.strip():
+        yield ContentBlock('text', text, text)
+
+
+def iter_blocks_regex(source: Union[str, os.PathLike, Iterable[str]]) -> Iterator[ContentBlock]:
+    current_content = []
+
+    # Regex patterns
+    code_block_pattern = re.compile(r'^```')
+    header_pattern = re.compile(r'^#+\s')
+    image_pattern = re.compile(r'!\[.*?\]\(.*?\)')
+    math_block_pattern = re.compile(r'^\$\$')
+
+    in_code_block = False
+    in_math_block = False
+
+    for line in MarkdownProcessor.iter_lines(source):
+        # Handle Code Blocks
+        if code_block_pattern.match(line):
+            if in_code_block:
+                # End of code block
+                current_content.append(line)
+                yield ContentBlock('code', '\n'.join(current_content), '\n'.join(current_content))
+                current_content = []
+                in_code_block = False
+                continue
+            else:
+                # Start of code block
+                if current_content:
+                    yield from _text_block(current_content)
+                    current_content = []
+                in_code_block = True
+                current_content.append(line)
+                continue
+
+        if in_code_block:
+            current_content.append(line)
+            continue
+
+        # Handle Math Blocks ($$)
+        if math_block_pattern.match(line):
+            if in_math_block:
+                # End of math block
+                current_content.append(line)
+                yield ContentBlock('formula', '\n'.join(current_content), '\n'.join(current_content))
+                current_content = []
+                in_math_block = False
+                continue
+            else:
+                # Start of math block
+                if current_content:
+                    yield from _text_block(current_content)
+                    current_content = []
+                in_math_block = True
+                current_content.append(line)
+                continue
+
+        if in_math_block:
+            current_content.append(line)
+            continue
+
+        # Handle Headers
+        if header_pattern.match(line):
+            if current_content:
+                yield from _text_block(current_content)
+                current_content = []
+            yield ContentBlock('header', line, line)
+            continue
+
+        # Handle Images
+        if image_pattern.match(line):
+            if current_content:
+                yield from _text_block(current_content)
+                current_content = []
+            yield ContentBlock('image', line, line)
+            continue
+
+        # Regular Text
+        if line.strip() == "":
+            if current_content:
+                yield from _text_block(current_content)
+                current_content = []
+            yield ContentBlock('separator', '', '\n')
+        else:
+            current_content.append(line)
+
+    # Flush remaining content
+    if current_content:
+        yield from _text_block(current_content)
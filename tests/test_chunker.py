@@ -0,0 +1,54 @@
+from core.chunker import Chunk, fold_translations, join_pieces, rechunk, split_block, split_sentences
+from core.processor import ContentBlock, MarkdownProcessor
+
+def test_split_sentences():
+    text = 'Dr. Smith saw M31, i.e. the nearest spiral. It is "bright." Then 2 more. 结束了。下一句！'
+    assert split_sentences(text) == ['Dr. Smith saw M31, i.e. the nearest spiral.', 'It is "bright."',
+                                     'Then 2 more.', '结束了。', '下一句！']
+    pieces = split_block("One sentence here. " * 30, 20)
+    assert len(pieces) > 1 and ' '.join(pieces) == ("One sentence here. " * 30).strip()
+
+def test_split_block_keeps_line_breaks():
+    text = "First line ends here.\nSecond line starts. It goes on.\nThird."
+    assert split_block(text, 10000) == [text]
+    lines = "\n".join(f"Line {i} of a hard-wrapped poem." for i in range(40))
+    pieces = split_block(lines, 50)
+    assert len(pieces) > 1 and all("\n" in piece for piece in pieces)
+    assert "\n".join(pieces) == lines
+
+    blocks = MarkdownProcessor().parse(lines)
+    chunks = rechunk(blocks, max_tokens=50)
+    assert [chunk.text for chunk in chunks] == pieces and chunks[0].separator == "\n"
+    # The translations are joined with the line breaks that separated the pieces
+    translations = fold_translations(chunks, [f"译{n}\n行" for n in range(len(chunks))], 1)
+    assert translations[0] == "\n".join(f"译{n}\n行" for n in range(len(chunks)))
+
+def test_rechunk_merges_runs_and_splits_oversize_blocks():
+    long_text = "A long sentence about galaxies and stars. " * 100
+    blocks = MarkdownProcessor().parse(f"Short one.\n\nShort two.\n\n# Header\n\nShort three.\n\n{long_text}\n\nTail.")
+    chunks = rechunk(blocks, target_tokens=50, max_tokens=200)
+    assert chunks[0] == Chunk("Short one.\n\nShort two.", [0, 1])
+    # The header ends the run; the oversize block is split on its own
+    assert chunks[1] == Chunk("Short three.", [2])
+    pieces = [chunk for chunk in chunks if chunk.part is not None]
+    assert len(pieces) > 1 and all(chunk.blocks == [3] for chunk in pieces)
+    assert chunks[-1] == Chunk("Tail.", [4])
+    # Defaults leave every block on its own
+    assert [chunk.blocks for chunk in rechunk(blocks)] == [[0], [1], [2], [3], [4]]
+    assert rechunk([ContentBlock('code', 'x = 1', '```\nx = 1\n```')]) == []
+
+def test_fold_translations_back_into_the_document():
+    processor = MarkdownProcessor()
+    blocks = processor.parse("Short one.\n\nShort two.\n\nFirst half. Second half.")
+    chunks = [Chunk("Short one.\n\nShort two.", [0, 1]), Chunk("First half.", [2], 0), Chunk("Second half.", [2], 1)]
+    translations = fold_translations(chunks, ["短一。\n\n短二。", "前半。", "后半。"], 3)
+    assert translations == [None, "短一。\n\n短二。", "前半。后半。"]
+    processor.inject_translations(blocks, translations)
+    output = processor.reconstruct(blocks, bilingual=True)
+    assert output.index("Short one.") < output.index("Short two.") < output.index("短一。") < output.index("First half.")
+    assert "First half. Second half.\n\n前半。后半。" in output
+
+def test_join_pieces_spaces_only_between_non_cjk_text():
+    assert join_pieces(["First part.", "Second part."]) == "First part. Second part."
+    assert join_pieces(["第一部分。", "第二部分。"]) == "第一部分。第二部分。"
+    assert join_pieces(["これはテスト", "です"]) == "これはテストです"  # kana is CJK too
@@ -0,0 +1,55 @@
+import pytest
+from core.classifier import classify_block, mark_passthrough, parse_categories
+from core.processor import MarkdownProcessor
+
+@pytest.mark.parametrize("text, category", [
+    ('<html><body><table><tr><td>Tier</td><td>Pattern Name</td></tr></table></body></html>', 'html'),
+    ("42", 'page_number'),
+    ("— xiv —", 'page_number'),
+    ("Page 17", 'page_number'),
+    ("本书聚焦于Java 2平台企业版（J2EE）的设计模式。", 'cjk'),
+    ("NGC 224  00 42 44.3  +41 16 09  3.4  178x63  Sb\nNGC 598  01 33 50.9  +30 39 37  5.7  73x45  Sc", 'numeric'),
+    ("* * *", 'numeric'),
+    ("（1）、【2】", 'numeric'),  # full-width punctuation alone isn't Chinese text
+    ("[1] Hubble, E. P. 1929, Proc. Natl. Acad. Sci., 15, 168\n"
+     "[2] Sandage, A. (1961). The Ability of the 200-inch Telescope. ApJ, 133:355", 'reference'),
+    ("Smith, J. et al. 2004, ApJ 600, doi:10.1086/380000", 'reference'),
+    ("The Andromeda Galaxy (M31) lies about 2.5 million light-years away and spans 3 degrees.", None),
+    ("In 1929 Hubble showed that the universe is expanding, as described in chapter 3.", None),
+    ("The comet was discovered by Hale et al. in 1995 and later studied by many observers.", None),
+    ("Observations began at 21:30 on 12 March 2004 and lasted until dawn.", None),
+    ("See pp. 5-7 of the 1998 edition for the full derivation.", None),
+    ("Vivid", None),
+    ("Mild", None),
+    ("Civil", None),
+    ("I", None),
+    ("mix", None),
+    ("— XIV —", 'page_number'),
+    ("Page XII", 'page_number'),
+    ("A temple called 少林寺 appears in the story of the monks who lived there for centuries.", None),
+])
+def test_classify_block(text, category):
+    assert classify_block(text) == category
+
+def test_only_enabled_categories_are_skipped():
+    assert classify_block("42", ['html']) is None
+    assert parse_categories("html, cjk") == ['html', 'cjk']
+    assert parse_categories("none") == []
+    with pytest.raises(ValueError):
+        parse_categories("tables")
+
+def test_mark_passthrough_reclassifies_and_reconstructs():
+    processor = MarkdownProcessor()
+    blocks = processor.parse("A paragraph to translate.\n\n12\n\n已经是中文的段落。\n")
+    assert mark_passthrough(blocks, parse_categories("page_number,cjk")) == {'page_number': 1, 'cjk': 1}
+    assert [b.type for b in blocks if b.type in ('text', 'passthrough')] == ['text', 'passthrough', 'passthrough']
+    assert blocks[2].metadata == {'skip': 'page_number'}
+
+    # Narrower rules on a later run turn blocks back into text
+    assert mark_passthrough(blocks, ['cjk']) == {'cjk': 1}
+    assert blocks[2].type == 'text' and blocks[2].metadata is None
+
+    processor.inject_translations(blocks, ["要翻译的段落。", "12"])
+    output = processor.reconstruct(blocks, bilingual=True)
+    assert "A paragraph to translate.\n\n要翻译的段落。" in output
+    assert output.count("已经是中文的段落。") == 1
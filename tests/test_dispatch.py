@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from config import Config
+from core.dispatch import dedupe, pack, translate_blocks
+
+def make_translator(translate, cached=()):
+    translator = MagicMock()
+    translator.max_concurrency = 4
+    translator.requests_sent = 0
+
+    def send(text, term_ids=None):
+        # Texts in `cached` are served from translation memory and send no request
+        if text not in cached:
+            translator.requests_sent += 1
+        return translate(text, term_ids=term_ids)
+
+    translator.translate = AsyncMock(side_effect=send)
+    return translator
+
+def test_dedupe_normalizes_whitespace():
+    texts = ["Figure credit: NASA", "Body text.", "Figure  credit:\nNASA", "Body text.", "Other"]
+    unique, owners = dedupe(texts)
+    assert unique == [0, 1, 4]
+    assert owners == [0, 1, 0, 1, 2]
+
+@pytest.mark.asyncio
+async def test_translate_blocks_fans_out_duplicates():
+    translator = make_translator(lambda text, term_ids=None: f"译:{text}")
+    texts = ["Page footer", "Paragraph one.", "Page footer", "Page  footer"]
+    translations, stats = await translate_blocks(translator, texts, [[1], [2], [1], [1]])
+
+    assert translations == ["译:Page footer", "译:Paragraph one.", "译:Page footer", "译:Page footer"]
+    assert stats['blocks'] == 4
+    assert stats['requests'] == 2
+    assert stats['deduplicated'] == 2
+    assert translator.translate.await_count == 2
+    sent = {call.args[0]: call.kwargs['term_ids'] for call in translator.translate.await_args_list}
+    assert sent == {"Page footer": [1], "Paragraph one.": [2]}
+
+def test_pack_respects_token_and_block_budgets():
+    texts = ["a" * 40, "b" * 40, "c" * 40, "d" * 400, "e" * 4, "f" * 4, "g" * 4]  # 10, 10, 10, 100, 1, 1, 1 tokens
+    assert pack(list(range(7)), texts, max_tokens=25, max_blocks=10) == [[0, 1], [2], [3], [4, 5, 6]]
+    assert pack(list(range(7)), texts, max_tokens=1000, max_blocks=3) == [[0, 1, 2], [3, 4, 5], [6]]
+
+@pytest.mark.asyncio
+async def test_translate_blocks_packs_and_falls_back(monkeypatch):
+    monkeypatch.setattr(Config, 'PACK_MAX_TOKENS', 100)
+    monkeypatch.setattr(Config, 'PACK_MAX_BLOCKS', 2)
+    translator = make_translator(lambda text, term_ids=None: f"译:{text}")
+    # First pack splits correctly, second one comes back malformed
+    replies = iter([["译:A", "译:B"], None])
+
+    def send_packed(texts, term_ids=None):
+        translator.requests_sent += 1
+        return next(replies)
+
+    translator.translate_packed = AsyncMock(side_effect=send_packed)
+
+    translations, stats = await translate_blocks(translator, ["A", "B", "C", "D", "A"])
+
+    assert translations == ["译:A", "译:B", "译:C", "译:D", "译:A"]
+    assert stats['requests'] == 4  # two packed requests, then C and D on their own
+    assert stats['packed_requests'] == 2
+    assert stats['pack_fallbacks'] == 1
+    assert translator.translate.await_count == 2
+
+@pytest.mark.asyncio
+async def test_translate_blocks_counts_only_requests_sent():
+    translator = make_translator(lambda text, term_ids=None: f"译:{text}", cached={"Remembered"})
+    translations, stats = await translate_blocks(translator, ["Remembered", "New", "Remembered"])
+
+    assert translations == ["译:Remembered", "译:New", "译:Remembered"]
+    assert stats['requests'] == 1
+
+@pytest.mark.asyncio
+async def test_pack_fallback_cancels_siblings_on_error(monkeypatch):
+    monkeypatch.setattr(Config, 'PACK_MAX_TOKENS', 100)
+    monkeypatch.setattr(Config, 'PACK_MAX_BLOCKS', 2)
+    cancelled = []
+
+    async def translate(text, term_ids=None):
+        if text == "A":
+            raise RuntimeError("budget exhausted")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+
+    translator = make_translator(None)
+    translator.translate = AsyncMock(side_effect=translate)
+    translator.translate_packed = AsyncMock(return_value=None)
+
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(translate_blocks(translator, ["A", "B"]), timeout=1)
+    assert cancelled == ["B"]
+
+@pytest.mark.asyncio
+async def test_translate_blocks_schedules_longest_first(monkeypatch):
+    monkeypatch.setattr(Config, 'SCHEDULE', 'longest_first')
+    started = []
+
+    def translate(text, term_ids=None):
+        started.append(text)
+        return f"译:{text}"
+
+    translator = make_translator(translate)
+    translator.max_concurrency = 1
+    texts = ["short", "a much longer block of text " * 10, "medium sized block", "tiny"]
+    translations, stats = await translate_blocks(translator, texts)
+
+    assert started == [texts[1], texts[2], texts[0], texts[3]]
+    assert translations == [f"译:{text}" for text in texts]  # still in document order
+    assert stats['schedule'] == 'longest_first'
+
+    started.clear()
+    await translate_blocks(translator, texts, priority=lambda group: group[0])
+    assert started == texts
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import time
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from config import Config
+from core.endpoints import Endpoint, EndpointPool
+from core.limiter import AdaptiveLimiter
+from core.translator import Translator
+
+def make_pool(**kwargs):
+    return EndpointPool([
+        Endpoint("http://a/v1", "key-a", "m", name="a", weight=2, max_concurrency=2),
+        Endpoint("http://b/v1", "key-b", "m", name="b", weight=1),
+    ], **kwargs)
+
+@pytest.mark.asyncio
+async def test_routes_by_weighted_least_outstanding_within_caps():
+    pool = make_pool()
+    picked = [(await pool.acquire()).name for _ in range(5)]
+    # a takes twice b's share until it hits its cap of 2, then b takes the rest
+    assert picked == ["a", "a", "b", "b", "b"]
+    a, b = pool.endpoints
+    assert (a.outstanding, b.outstanding) == (2, 3)
+    pool.release(a)
+    assert (await pool.acquire()) is a
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_capacity():
+    pool = EndpointPool([Endpoint("http://a/v1", "k", "m", max_concurrency=1)])
+    first = await pool.acquire()
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    pool.release(first)
+    assert await asyncio.wait_for(waiter, 1) is first
+
+def test_ejects_after_repeated_failures_but_keeps_last_healthy():
+    pool = make_pool(failure_threshold=2, eject_seconds=30)
+    a, b = pool.endpoints
+    pool.report(a, AdaptiveLimiter.ERROR)
+    pool.report(a, AdaptiveLimiter.OK)  # success resets the streak
+    pool.report(a, AdaptiveLimiter.THROTTLED)
+    assert not a.is_ejected()
+    pool.report(a, AdaptiveLimiter.ERROR)
+    assert a.is_ejected()
+    assert pool._pick() is b
+
+    # b is now the only healthy endpoint: it is never ejected
+    for _ in range(5):
+        pool.report(b, AdaptiveLimiter.ERROR)
+    assert not b.is_ejected()
+
+    pool.reinstate(a)
+    assert not a.is_ejected()
+    assert pool.stats()['a']['ejections'] == 1
+
+@pytest.mark.asyncio
+async def test_translator_fails_over_to_healthy_endpoint(monkeypatch, tmp_path):
+    calls = {'bad': 0, 'good': 0}
+
+    def make_app(name, status):
+        async def chat(request):
+            calls[name] += 1
+            if status != 200:
+                return web.Response(status=status, text="overloaded")
+            return web.json_response({'choices': [{'message': {'content': '译文'}}]})
+
+        async def models(request):
+            return web.json_response({'data': []}, status=status)
+
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', chat)
+        app.router.add_get('/v1/models', models)
+        return app
+
+    bad, good = TestServer(make_app('bad', 503)), TestServer(make_app('good', 200))
+    await bad.start_server()
+    await good.start_server()
+    endpoints_file = tmp_path / "endpoints.json"
+    endpoints_file.write_text(json.dumps([
+        {'name': 'bad', 'base_url': str(bad.make_url('/v1')), 'weight': 10},
+        {'name': 'good', 'base_url': str(good.make_url('/v1'))},
+    ]))
+    monkeypatch.setattr(Config, 'ENDPOINTS_FILE', str(endpoints_file))
+    monkeypatch.setattr(Config, 'ENDPOINT_FAILURE_THRESHOLD', 2)
+    monkeypatch.setattr(Config, 'RETRY_ATTEMPTS', 3)
+    monkeypatch.setattr(Config, 'BREAKER_FAILURE_THRESHOLD', 1)
+    monkeypatch.setattr(asyncio, 'sleep', _fast_sleep)
+
+    translator = Translator()
+    try:
+        results = [await translator.translate(f"Block {i}") for i in range(6)]
+        assert results == ['译文'] * 6
+        assert calls['bad'] == 2  # ejected after two failures, everything else goes to 'good'
+        assert translator.pool.stats()['bad']['ejections'] == 1
+        # One dead endpoint never pauses requests to the healthy one
+        assert translator.breaker.times_opened == 0
+        assert not await translator.pool.check_health(translator.session, translator.pool.endpoints[0])
+        assert await translator.pool.check_health(translator.session, translator.pool.endpoints[1])
+    finally:
+        await translator.close()
+        await bad.close()
+        await good.close()
+
+@pytest.mark.asyncio
+async def test_throttled_request_moves_on_without_holding_its_slot(monkeypatch, tmp_path):
+    calls = {'busy': 0, 'free': 0}
+
+    def make_app(name, status):
+        async def chat(request):
+            calls[name] += 1
+            if status == 429:
+                return web.Response(status=429, headers={'Retry-After': '30'}, text="slow down")
+            return web.json_response({'choices': [{'message': {'content': '译文'}}]})
+
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', chat)
+        return app
+
+    busy, free = TestServer(make_app('busy', 429)), TestServer(make_app('free', 200))
+    await busy.start_server()
+    await free.start_server()
+    endpoints_file = tmp_path / "endpoints.json"
+    endpoints_file.write_text(json.dumps([
+        {'name': 'busy', 'base_url': str(busy.make_url('/v1')), 'weight': 10},
+        {'name': 'free', 'base_url': str(free.make_url('/v1'))},
+    ]))
+    monkeypatch.setattr(Config, 'ENDPOINTS_FILE', str(endpoints_file))
+    monkeypatch.setattr(Config, 'MAX_CONCURRENCY', 1)
+
+    translator = Translator()
+    try:
+        # The 30s Retry-After pauses 'busy' instead of blocking the only concurrency slot
+        results = await asyncio.wait_for(
+            asyncio.gather(*(translator.translate(f"Block {i}") for i in range(3))), timeout=5
+        )
+        assert results == ['译文'] * 3
+        assert calls == {'busy': 1, 'free': 3}
+        assert translator.pool.endpoints[0].rate_limiter.is_paused()
+    finally:
+        await translator.close()
+        await busy.close()
+        await free.close()
+
+@pytest.mark.asyncio
+async def test_throttled_single_endpoint_waits_outside_its_slot(monkeypatch):
+    calls = []
+
+    async def chat(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return web.Response(status=429, headers={'Retry-After': '0.5'}, text="slow down")
+        return web.json_response({'choices': [{'message': {'content': '译文'}}]})
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    monkeypatch.setattr(Config, 'MAX_CONCURRENCY', 1)
+
+    translator = Translator()
+    try:
+        task = asyncio.create_task(translator.translate("Block"))
+        await asyncio.sleep(0.2)
+        # Backing off, but not holding the only concurrency slot
+        assert len(calls) == 1 and not translator.semaphore.locked()
+        assert await asyncio.wait_for(task, timeout=5) == '译文'
+        assert calls[1] - calls[0] >= 0.45
+    finally:
+        await translator.close()
+        await server.close()
+
+_real_sleep = asyncio.sleep
+
+async def _fast_sleep(delay, *args, **kwargs):
+    # Skip retry backoff in tests
+    await _real_sleep(0)
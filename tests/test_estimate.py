@@ -0,0 +1,49 @@
+import pytest
+from config import Config
+from core.estimate import add_estimates, estimate_translation, format_estimate
+from core.glossary import GlossaryLoader
+from core.tokens import estimate_tokens
+
+@pytest.fixture
+def glossary(tmp_path):
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text("redshift\t红移\nquasar\t类星体\n", encoding="utf-8")
+    return GlossaryLoader(str(glossary_file))
+
+def test_estimate_counts_deduplicated_requests_and_glossary(monkeypatch, glossary):
+    monkeypatch.setattr(Config, 'PACK_MAX_TOKENS', 0)
+    monkeypatch.setattr(Config, 'MAX_CONCURRENCY', 2)
+    monkeypatch.setattr(Config, 'TOKEN_PRICES', f"{Config.MODEL_NAME}=1/2")
+    texts = ["A distant quasar.", "Plain text without terms.", "A distant quasar.", "The redshift is large. " * 20]
+
+    estimate = estimate_translation(texts, glossary)
+    assert estimate['requests'] == 3
+    assert estimate['glossary_tokens'] > 0
+    # Every request carries at least the system prompt
+    assert estimate['prompt_tokens'] > 3 * estimate_tokens(Config.SYSTEM_PROMPT)
+    assert estimate['total_tokens'] == estimate['prompt_tokens'] + estimate['completion_tokens']
+    assert estimate['cost_usd'] == pytest.approx(
+        (estimate['prompt_tokens'] + 2 * estimate['completion_tokens']) / 1_000_000, abs=1e-4)
+    # The long block keeps one worker busy while the other takes the two short ones
+    durations = [Config.ESTIMATE_REQUEST_SECONDS + int(estimate_tokens(t) * 1.5) / Config.ESTIMATE_TOKENS_PER_SECOND
+                 for t in texts[:2] + texts[3:]]
+    assert estimate['wall_seconds'] == pytest.approx(max(durations[2], durations[0] + durations[1]), abs=0.1)
+
+    without_glossary = estimate_translation(texts)
+    assert without_glossary['glossary_tokens'] == 0
+    assert without_glossary['prompt_tokens'] < estimate['prompt_tokens']
+
+def test_estimate_packs_and_respects_rate_limits(monkeypatch):
+    monkeypatch.setattr(Config, 'PACK_MAX_TOKENS', 1000)
+    monkeypatch.setattr(Config, 'PACK_MAX_BLOCKS', 5)
+    monkeypatch.setattr(Config, 'RATE_LIMIT_RPM', 1)
+    texts = [f"Sentence number {i}." for i in range(12)]
+
+    estimate = estimate_translation(texts)
+    assert estimate['requests'] == 3
+    # Three requests at one per minute
+    assert estimate['wall_seconds'] == 180
+
+    total = add_estimates(add_estimates(None, estimate), estimate)
+    assert total['requests'] == 6 and total['wall_seconds'] == 360
+    assert "6 requests for 24 text blocks" in format_estimate(total)[0]
@@ -35,6 +35,84 @@ def test_glossary_relevant_terms():
     # Should find redshift and black hole
     assert any("redshift" in term.lower() for term in relevant.keys())
 
+def test_matcher_matches_regex_reference(tmp_path):
+    """Aho-Corasick matcher must agree with the per-variant regex scan."""
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text(
+        "redshift\t红移\n"
+        "Red Shift\t红移\n"
+        "red\t红\n"
+        "R.A.\t赤经\n"
+        "'Oumuamua\t奥陌陌\n"
+        "DESTINY+\t命运+\n"
+        "1/f noise\t1/f 噪声\n"
+        "H\t氢\n"
+        "HII region\t电离氢区\n"
+        "shift\t移动\n",
+        encoding="utf-8",
+    )
+    glossary = GlossaryLoader(str(glossary_file))
+
+    texts = [
+        "The REDSHIFT of the galaxy and its red shift.",
+        "Redshifted lines are not a match, neither is shifted.",
+        "Its R.A. is 12h; R.A.B is not a word boundary.",
+        "The interstellar object 'Oumuamua and the DESTINY+ mission.",
+        "Measured 1/f noise near an HII region and H_alpha.",
+        "H-alpha emission from H",
+        "",
+    ]
+    for text in texts:
+        assert glossary.get_relevant_terms(text) == glossary._get_relevant_terms_regex(text)
+        assert glossary.get_relevant_terms(text, max_terms=2) == glossary._get_relevant_terms_regex(text, max_terms=2)
+
+def test_glossary_index_round_trip(tmp_path):
+    """Compiled index is written on first load and reused until the source changes."""
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text("redshift\t红移\nBlack Hole\t黑洞\nblack hole\t黑洞\n", encoding="utf-8")
+
+    cold = GlossaryLoader(str(glossary_file))
+    assert cold.index_path.exists()
+
+    warm = GlossaryLoader(str(glossary_file))
+    assert warm._glossary is None  # restored from the index, dict not rebuilt yet
+    assert warm.glossary == cold.glossary
+    text = "A black hole with a large redshift."
+    assert warm.get_relevant_terms(text) == cold.get_relevant_terms(text) == {'Black Hole': '黑洞', 'redshift': '红移'}
+
+    # Changing the source invalidates the index
+    glossary_file.write_text("redshift\t红移\nquasar\t类星体\n", encoding="utf-8")
+    updated = GlossaryLoader(str(glossary_file))
+    assert updated._glossary is not None
+    assert updated.get_relevant_terms("A quasar.") == {'quasar': '类星体'}
+    assert GlossaryLoader(str(glossary_file)).get_relevant_terms("A quasar.") == {'quasar': '类星体'}
+
+def test_glossary_corrupt_index_is_rebuilt(tmp_path):
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text("redshift\t红移\n", encoding="utf-8")
+    loader = GlossaryLoader(str(glossary_file))
+    loader.index_path.write_bytes(b"not an index")
+
+    reloaded = GlossaryLoader(str(glossary_file))
+    assert reloaded.get_translation("Redshift") == "红移"
+    assert GlossaryLoader(str(glossary_file))._glossary is None
+
+def test_glossary_prescan(tmp_path):
+    """Pre-scan yields per-block term ids and document-level frequencies."""
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text("redshift\t红移\nBlack Hole\t黑洞\nquasar\t类星体\n", encoding="utf-8")
+    glossary = GlossaryLoader(str(glossary_file))
+
+    texts = ["A black hole.", "Redshift of a quasar behind a black hole.", "Nothing here."]
+    block_terms, frequencies = glossary.prescan(texts)
+
+    assert block_terms == [[1], [0, 1, 2], []]
+    assert frequencies == {'Black Hole': 2, 'redshift': 1, 'quasar': 1}
+    for text, term_ids in zip(texts, block_terms):
+        assert glossary.terms_from_ids(term_ids) == glossary.get_relevant_terms(text)
+    assert glossary.terms_from_ids(block_terms[1], max_terms=1) == {'redshift': '红移'}
+    assert glossary.fingerprint == GlossaryLoader(str(glossary_file)).fingerprint
+
 @pytest.mark.asyncio
 async def test_translator_with_glossary():
     """Test translator uses glossary correctly."""
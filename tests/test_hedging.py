@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from config import Config
+from core.hedging import Hedger
+from core.translator import Translator
+
+def test_hedge_delay_and_fraction_cap():
+    hedger = Hedger(max_fraction=0.1, min_samples=10, min_delay=0.5)
+    assert hedger.delay() is None
+    for latency in range(1, 21):
+        hedger.record(float(latency))
+    assert hedger.delay() == 20.0  # p95 of 1..20
+    assert hedger.delay('packed') is None  # tracked separately
+    hedger.record(0.1, 'packed')
+
+    hedger.requests = 25
+    assert hedger.allow()
+    hedger.hedges = 2
+    assert not hedger.allow()  # a third hedge would exceed 10% of 25 requests
+
+    fast = Hedger(min_samples=1, min_delay=0.5)
+    fast.record(0.01)
+    assert fast.delay() == 0.5
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged_and_loser_cancelled(monkeypatch):
+    calls = {'count': 0, 'cancelled': 0}
+
+    async def chat(request):
+        calls['count'] += 1
+        if calls['count'] == 1:
+            try:
+                await asyncio.sleep(5)  # the primary stalls
+            except asyncio.CancelledError:
+                calls['cancelled'] += 1
+                raise
+        return web.json_response({'choices': [{'message': {'content': '译文'}}]})
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    monkeypatch.setattr(Config, 'HEDGE_REQUESTS', True)
+    monkeypatch.setattr(Config, 'HEDGE_MAX_FRACTION', 1.0)
+    monkeypatch.setattr(Config, 'HEDGE_MIN_DELAY', 0.1)
+
+    translator = Translator()
+    for _ in range(20):
+        translator.hedger.record(0.05)
+    try:
+        started = time.monotonic()
+        assert await translator.translate("Slow block") == '译文'
+        assert time.monotonic() - started < 2
+        await asyncio.sleep(0.1)
+        assert calls == {'count': 2, 'cancelled': 1}
+        assert translator.hedger.stats()['hedge_wins'] == 1
+    finally:
+        await translator.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_streaming_stats_skip_the_cancelled_loser(monkeypatch):
+    calls = {'count': 0}
+
+    async def chat(request):
+        calls['count'] += 1
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for chunk in ["译", "文"]:
+            event = {'choices': [{'delta': {'content': chunk}}]}
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+            if calls['count'] == 1:
+                await asyncio.sleep(5)  # the primary stalls mid-stream
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    monkeypatch.setattr(Config, 'STREAM_RESPONSES', True)
+    monkeypatch.setattr(Config, 'HEDGE_REQUESTS', True)
+    monkeypatch.setattr(Config, 'HEDGE_MAX_FRACTION', 1.0)
+    monkeypatch.setattr(Config, 'HEDGE_MIN_DELAY', 0.1)
+
+    translator = Translator()
+    for _ in range(20):
+        translator.hedger.record(0.05)
+    try:
+        assert await translator.translate("Slow block") == '译文'
+        assert translator.requests_sent == 2
+        stats = translator.streaming_stats()
+        assert stats['requests'] == 1
+        assert stats['blocks'] == 1
+    finally:
+        await translator.close()
+        await server.close()
+
+def make_app(state, delays):
+    async def chat(request):
+        state['count'] += 1
+        state['running'] += 1
+        state['peak'] = max(state['peak'], state['running'])
+        try:
+            await asyncio.sleep(delays[min(state['count'], len(delays)) - 1])
+            return web.json_response({'choices': [{'message': {'content': '译文'}}],
+                                      'usage': {'prompt_tokens': 100, 'completion_tokens': 5}})
+        finally:
+            state['running'] -= 1
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    return app
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_concurrency, delays, sent, cancelled", [
+    (1, [0.4], 1, 0),       # no slot is free, so no hedge is sent
+    (2, [0.4, 5.0], 2, 1),  # the hedge takes the free slot, loses, and its prompt is still counted
+])
+async def test_hedge_needs_a_free_slot(monkeypatch, max_concurrency, delays, sent, cancelled):
+    state = {'count': 0, 'running': 0, 'peak': 0}
+    server = TestServer(make_app(state, delays))
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    monkeypatch.setattr(Config, 'MAX_CONCURRENCY', max_concurrency)
+    monkeypatch.setattr(Config, 'HEDGE_REQUESTS', True)
+    monkeypatch.setattr(Config, 'HEDGE_MAX_FRACTION', 1.0)
+    monkeypatch.setattr(Config, 'HEDGE_MIN_DELAY', 0.1)
+
+    translator = Translator()
+    for _ in range(20):
+        translator.hedger.record(0.05)
+    try:
+        assert await translator.translate("Slow block") == '译文'
+        await asyncio.sleep(0.1)
+        assert translator.hedger.stats()['hedges'] == sent - 1
+        assert state['peak'] == sent
+        assert translator.requests_sent == sent
+        stage = translator.usage.summary()['stages']['translate']
+        assert stage.get('cancelled_requests', 0) == cancelled
+        assert stage['requests'] == 1
+        if cancelled:
+            assert stage['prompt_tokens'] > 100
+        else:
+            assert stage['prompt_tokens'] == 100
+    finally:
+        await translator.close()
+        await server.close()
@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from core.dispatch import translate_blocks
+from core.journal import TranslationJournal
+
+def test_journal_round_trip_and_validation(tmp_path):
+    journal = TranslationJournal(str(tmp_path / "state.journal.jsonl"))
+    texts = ["Alpha", "Beta", "Gamma"]
+    journal.record(0, texts[0], "阿尔法")
+    journal.record(1, texts[1], "[Translation Failed]")  # retried on resume, never journaled
+    journal.record(2, texts[2], "伽马")
+    journal.close()
+
+    # Simulate a torn write from a killed process
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"i": 1, "h": "')
+
+    assert journal.load(texts) == {0: "阿尔法", 2: "伽马"}
+    # A block whose source changed since it was journaled is dropped
+    assert journal.load(["Alpha", "Beta", "Gamma, revised"]) == {0: "阿尔法"}
+
+    journal.reset()
+    assert journal.load(texts) == {}
+
+def test_journal_appends_after_torn_line(tmp_path):
+    journal = TranslationJournal(str(tmp_path / "state.journal.jsonl"))
+    texts = ["Alpha", "Beta", "Gamma"]
+    journal.record(0, texts[0], "A")
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"i": 1, "h": "')
+
+    # A resumed run appends to the same journal
+    resumed = TranslationJournal(str(journal.path))
+    resumed.record(2, texts[2], "C")
+    resumed.close()
+
+    assert resumed.load(texts) == {0: "A", 2: "C"}
+
+@pytest.mark.asyncio
+async def test_translate_blocks_resumes_missing_only(tmp_path):
+    translator = MagicMock()
+    translator.max_concurrency = 4
+    translator.requests_sent = 0
+
+    def translate(text, term_ids=None):
+        translator.requests_sent += 1
+        return f"译:{text}"
+
+    translator.translate = AsyncMock(side_effect=translate)
+    journal = TranslationJournal(str(tmp_path / "state.journal.jsonl"))
+    texts = ["A", "B", "A", "C"]
+
+    translations, stats = await translate_blocks(
+        translator, texts, done={0: "旧:A", 1: "旧:B"},
+        on_result=lambda i, translation: journal.record(i, texts[i], translation)
+    )
+    journal.close()
+
+    assert translations == ["旧:A", "旧:B", "译:A", "译:C"]
+    assert stats['resumed'] == 2
+    assert stats['requests'] == 2
+    assert translator.translate.await_count == 2
+    assert journal.load(texts) == {2: "译:A", 3: "译:C"}
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from core.limiter import AdaptiveLimiter
+
+@pytest.mark.asyncio
+async def test_limits_in_flight_requests():
+    limiter = AdaptiveLimiter(2, min_limit=1, max_limit=4)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            assert limiter.locked() == (limiter.in_flight == 2)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(work() for _ in range(10)))
+    assert peak == 2
+    assert limiter.in_flight == 0
+    assert not limiter.locked()
+
+def test_additive_increase_and_multiplicative_decrease():
+    limiter = AdaptiveLimiter(4, min_limit=2, max_limit=6)
+    for _ in range(5):
+        limiter.record(AdaptiveLimiter.OK, 1.0)
+    assert limiter.current_limit == 5  # about one slot per window of successes
+
+    for _ in range(50):
+        limiter.record(AdaptiveLimiter.OK, 1.0)
+    assert limiter.current_limit == 6  # capped at max_limit
+
+    limiter.record(AdaptiveLimiter.THROTTLED)
+    assert limiter.current_limit == 3
+    limiter.record(AdaptiveLimiter.THROTTLED)  # same burst, inside the cooldown
+    assert limiter.current_limit == 3
+
+    limiter._last_decrease = 0.0
+    limiter.record(AdaptiveLimiter.ERROR)
+    assert limiter.current_limit == 2  # floored at min_limit
+    assert limiter.stats()['outcomes'] == {'ok': 55, 'throttled': 2, 'error': 1}
+
+def test_no_increase_while_latency_degrades():
+    limiter = AdaptiveLimiter(4, max_limit=10)
+    limiter.record(AdaptiveLimiter.OK, 1.0)
+    limit = limiter.limit
+    for _ in range(20):
+        limiter.record(AdaptiveLimiter.OK, 10.0)
+    assert limiter.limit - limit < 1.0
+
+@pytest.mark.asyncio
+async def test_raising_limit_wakes_waiters():
+    limiter = AdaptiveLimiter(1, max_limit=2)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    limiter.limit = 1.9
+    limiter.record(AdaptiveLimiter.OK)
+    await asyncio.wait_for(waiter, 1)
+    assert limiter.in_flight == 2
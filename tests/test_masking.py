@@ -0,0 +1,66 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from config import Config
+from core.masking import mask_spans, unmask_spans
+from core.translator import Translator
+
+def test_mask_round_trip():
+    text = ("M31 lies at $\\alpha = 00^h 42^m$ (see [the catalog](https://example.org/ngc?id=224)), "
+            "costs $5 and $10, runs `ls -l`, footnote[^3] <br> ![M31](images/m31.jpg) and https://sky.org/m31.")
+    masked, spans = mask_spans(text)
+    assert spans == ['$\\alpha = 00^h 42^m$', 'https://example.org/ngc?id=224', '`ls -l`', '[^3]', '<br>',
+                     '![M31](images/m31.jpg)', 'https://sky.org/m31']
+    # Link text and currency amounts are still translated
+    assert "[the catalog]({{1}})" in masked and "$5 and $10" in masked
+    assert unmask_spans(masked, spans) == text
+
+def test_unmask_requires_every_placeholder_once():
+    masked, spans = mask_spans("Magnitude $m_V = 3.4$ at $z = 0.1$", start=5)
+    assert masked == "Magnitude {{5}} at {{6}}"
+    assert unmask_spans("星等 {{ 5 }}，位于 {{6}}", spans, start=5) == "星等 $m_V = 3.4$，位于 $z = 0.1$"
+    assert unmask_spans("星等 {{5}}", spans, start=5) is None
+    assert unmask_spans("星等 {{5}} {{5}} {{6}}", spans, start=5) is None
+    assert unmask_spans("星等 {{5}} {{6}} {{7}}", spans, start=5) is None
+    # Text that already looks like it has placeholders is left alone
+    assert mask_spans("Fill in {{1}} with $x$") == ("Fill in {{1}} with $x$", [])
+
+def _response(content):
+    response = AsyncMock()
+    response.status = 200
+    response.headers = {}
+    response.json.return_value = {'choices': [{'message': {'content': content}}]}
+    return response
+
+@pytest.mark.asyncio
+async def test_translator_masks_and_falls_back_when_a_placeholder_is_lost(monkeypatch):
+    monkeypatch.setattr(Config, 'MASK_SPANS', True)
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_post.return_value.__aenter__.side_effect = [
+            _response("星等为 {{0}}。"),
+            _response("星等为 m = 3。"),          # placeholder dropped
+            _response("星等为 $m = 3$。"),        # unmasked re-send
+        ]
+        translator = Translator()
+        assert await translator.translate("The magnitude is $m = 3$.") == "星等为 $m = 3$。"
+        sent = mock_post.call_args_list[0].kwargs['json']['messages']
+        assert sent[1]['content'] == "Original Text:\nThe magnitude is {{0}}.\n\nTranslation:"
+        assert Config.MASK_INSTRUCTION in sent[0]['content']
+
+        assert await translator.translate("Its magnitude is $m = 3$.") == "星等为 $m = 3$。"
+        resent = mock_post.call_args_list[2].kwargs['json']['messages']
+        assert "$m = 3$" in resent[1]['content'] and Config.MASK_INSTRUCTION not in resent[0]['content']
+        assert (translator.masked_spans, translator.mask_fallbacks) == (2, 1)
+        await translator.close()
+
+@pytest.mark.asyncio
+async def test_packed_placeholders_are_numbered_across_segments(monkeypatch):
+    monkeypatch.setattr(Config, 'MASK_SPANS', True)
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_post.return_value.__aenter__.return_value = _response(
+            "<<<SEGMENT 1>>>\n运行 {{0}}\n\n<<<SEGMENT 2>>>\n红移 {{1}}，见 {{2}}")
+        translator = Translator()
+        results = await translator.translate_packed(["Run `make`", "Redshift $z$, see <br>"])
+        assert results == ["运行 `make`", "红移 $z$，见 <br>"]
+        sent = mock_post.call_args.kwargs['json']['messages'][1]['content']
+        assert "<<<SEGMENT 1>>>\nRun {{0}}\n\n<<<SEGMENT 2>>>\nRedshift {{1}}, see {{2}}" in sent
+        await translator.close()
@@ -0,0 +1,63 @@
+import pytest
+from core.memory import TranslationMemory
+
+@pytest.fixture
+def memory(tmp_path):
+    tm = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    yield tm
+    tm.close()
+
+def test_key_normalizes_whitespace():
+    """Reflowed copies of a block share a key; model/prompt/glossary changes do not."""
+    key = TranslationMemory.make_key("See  Table 3.\n", "model-a", "prompt", "glossary")
+    assert key == TranslationMemory.make_key("See Table\n3.", "model-a", "prompt", "glossary")
+    assert key != TranslationMemory.make_key("See Table 3.", "model-b", "prompt", "glossary")
+    assert key != TranslationMemory.make_key("See Table 3.", "model-a", "prompt v2", "glossary")
+    assert key != TranslationMemory.make_key("See Table 3.", "model-a", "prompt", None)
+
+def test_get_put_and_counters(memory):
+    key = memory.make_key("Hello", "m", "p")
+    assert memory.get(key) is None
+    memory.put(key, "Hello", "你好", "m")
+    assert memory.get(key) == "你好"
+
+    stats = memory.stats()
+    assert stats['entries'] == 1
+    assert stats['session_hits'] == 1
+    assert stats['session_misses'] == 1
+    assert stats['lifetime_hits'] == 1
+    assert stats['models'] == {'m': 1}
+
+def test_persists_across_instances(tmp_path):
+    db_path = str(tmp_path / "tm.sqlite")
+    first = TranslationMemory(db_path)
+    key = first.make_key("Hello", "m", "p")
+    first.put(key, "Hello", "你好", "m")
+    first.close()
+
+    second = TranslationMemory(db_path)
+    assert second.get(key) == "你好"
+    second.close()
+
+def test_evicts_least_recently_used(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"), max_size_mb=0.001)  # ~1 KB budget
+    keys = []
+    for i in range(10):
+        key = memory.make_key(f"block {i}", "m", "p")
+        memory.put(key, f"block {i}", "译" * 50, "m")
+        keys.append(key)
+    memory.get(keys[0])  # touch the oldest entry so it survives
+
+    assert memory.evict() > 0
+    assert memory.total_size() <= memory.max_size_bytes
+    assert memory.get(keys[0]) is not None
+    assert memory.get(keys[1]) is None
+    memory.close()
+
+def test_purge_by_model(memory):
+    memory.put(memory.make_key("a", "m1", "p"), "a", "甲", "m1")
+    memory.put(memory.make_key("b", "m2", "p"), "b", "乙", "m2")
+    assert memory.purge("m1") == 1
+    assert memory.stats()['models'] == {'m2': 1}
+    memory.purge()
+    assert memory.stats()['entries'] == 0
@@ -1,5 +1,7 @@
 import pytest
-from core.processor import MarkdownProcessor, ContentBlock
+from pathlib import Path
+from core.processor import MarkdownProcessor, ContentBlock, deserialize_blocks, serialize_blocks
+from regex_parser import iter_blocks_regex
 
 @pytest.fixture
 def processor():
@@ -47,3 +49,40 @@ def test_reconstruct_bilingual(processor):
     output = processor.reconstruct(blocks, bilingual=True)
     assert "Hello" in output
     assert "你好" in output
+
+def test_parse_streams_from_file_and_line_iterators(processor, tmp_path):
+    text = "# Header\nParagraph 1.\n\n$$\nE = mc^2\n$$\n```\ncode\n```\n![Image](img.png)\nParagraph 2.\n"
+    path = tmp_path / "book.md"
+    path.write_text(text, encoding='utf-8')
+    expected = [(b.type, b.content, b.original) for b in processor.parse(text)]
+    # The trailing newline still ends in a separator block
+    assert expected[-1] == ('separator', '', '\n')
+    for source in (path, path.open(encoding='utf-8'), iter(text.splitlines(keepends=True))):
+        assert [(b.type, b.content, b.original) for b in processor.iter_blocks(source)] == expected
+    # Blocks come out one at a time
+    blocks = processor.iter_blocks(path)
+    assert next(blocks).type == 'header'
+
+def test_serialized_blocks_round_trip(processor):
+    blocks = processor.parse("# Title\n\n\n\nParagraph.\n\n```\ncode\n```\n")
+    blocks[4].translation = '段落。'
+    blocks[4].metadata = {'skip': 'cjk'}
+    rows = serialize_blocks(blocks)
+    # Blank lines collapse into runs and identical originals are not repeated
+    assert rows[:3] == [['header', '# Title'], ['separator', 3], ['text', 'Paragraph.', None, '段落。', {'skip': 'cjk'}]]
+    assert deserialize_blocks(rows) == blocks
+    # States saved before the compact format still load
+    assert deserialize_blocks([{'type': 'text', 'content': 'Hi', 'original': 'Hi', 'translation': None}]) == [
+        ContentBlock('text', 'Hi', 'Hi')]
+
+def test_dispatch_parser_matches_regex_parser(processor):
+    # Edge cases around each special first character, including a code fence inside a math block
+    text = ("#Not a header\n#\tTab header\n##  \n! not an image\n![alt](img.png) caption\n![broken](img.png\n"
+            "$ not math\n$$\n x \n```\ninside\n```\n$$\n`inline` text\n　\n  \n```\n$$\n\n```\nend")
+    sources = [text]
+    md_file = Path(__file__).resolve().parent.parent / "debug_md.txt"
+    if md_file.exists():
+        # Real magic-pdf output
+        sources.append(processor.load_markdown(md_file))
+    for source in sources:
+        assert list(processor.iter_blocks(source)) == list(iter_blocks_regex(source))
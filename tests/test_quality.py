@@ -0,0 +1,26 @@
+from core.quality import check_translation, find_retry_candidates
+
+LONG_SOURCE = ("Quasars are extremely luminous active galactic nuclei powered by accretion "
+               "onto supermassive black holes at the centres of distant galaxies. "
+               "Their spectra show strongly redshifted broad emission lines.")
+
+def test_check_translation_reasons():
+    assert check_translation(LONG_SOURCE, "类星体是由遥远星系中心超大质量黑洞吸积驱动的极亮活动星系核。其光谱显示出强烈红移的宽发射线。") is None
+    assert check_translation(LONG_SOURCE, "[Translation Failed]") == 'failed'
+    assert check_translation(LONG_SOURCE, "[Translation Error: 429]") == 'failed'
+    assert check_translation(LONG_SOURCE, None) == 'failed'
+    assert check_translation(LONG_SOURCE, "  \n") == 'empty'
+    assert check_translation(LONG_SOURCE, LONG_SOURCE) == 'untranslated'
+    assert check_translation(LONG_SOURCE, "类星体是") == 'truncated'
+
+def test_short_and_symbolic_blocks_are_not_flagged():
+    # Labels, formulas and numbers are legitimately kept as-is
+    assert check_translation("NGC 4151", "NGC 4151") is None
+    assert check_translation("$E = mc^2$", "$E = mc^2$") is None
+    assert check_translation("Hello world", "你好") is None
+    assert check_translation("", "") is None
+
+def test_find_retry_candidates():
+    sources = ["Intro", LONG_SOURCE, "Outro", "Missing"]
+    translations = ["介绍", "[Translation Error: Invalid Response]", ""]
+    assert find_retry_candidates(sources, translations) == {1: 'failed', 2: 'empty', 3: 'failed'}
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from core.ratelimit import RateLimiter, TokenBucket, parse_duration, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_refill_and_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)  # one token per second
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+
+    # Underestimated usage leaves the bucket in debt
+    bucket.consume(10)
+    assert bucket.wait_time(1) == pytest.approx(10.5)
+    # Requests larger than the bucket wait for a full bucket, not forever
+    clock.now += 200
+    assert bucket.wait_time(500) == 0
+
+def test_parse_header_values():
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("1h2m3s") == 3723.0
+    assert parse_duration("soon") is None
+    assert parse_duration(None) is None
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # in the past
+    assert parse_retry_after("garbage") is None
+
+def test_headers_pause_all_callers():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=600, tpm=60000, clock=clock)
+    assert limiter.wait_time(100) == 0
+
+    assert limiter.update_from_headers({'Retry-After': '2'}) == 2.0
+    assert limiter.wait_time(100) == pytest.approx(2.0)
+
+    limiter.update_from_headers({
+        'x-ratelimit-remaining-requests': '0',
+        'x-ratelimit-reset-requests': '5s',
+        'x-ratelimit-remaining-tokens': '50',
+    })
+    assert limiter.wait_time(1) == pytest.approx(5.0)
+    assert limiter.tokens.level == 50
+    clock.now += 5
+    assert limiter.wait_time(50) == 0
+
+@pytest.mark.asyncio
+async def test_acquire_spaces_requests_to_quota():
+    limiter = RateLimiter(rpm=6000)  # 100 requests/s
+    assert limiter.requests.capacity == 1000
+    limiter.requests.level = 0
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.gather(*(limiter.acquire() for _ in range(5)))
+    elapsed = loop.time() - started
+    assert 0.04 <= elapsed < 0.5
+    assert limiter.waited > 0
+
+@pytest.mark.asyncio
+async def test_disabled_buckets_do_not_wait():
+    limiter = RateLimiter()
+    await asyncio.wait_for(asyncio.gather(*(limiter.acquire(10 ** 6) for _ in range(100))), timeout=1)
+    assert limiter.waited == 0
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from config import Config
+from core.retry import CircuitBreaker, RetryPolicy
+from core.translator import Translator
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_retry_policy_jitter_and_budgets():
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=4.0, budgets={'timeout': 1})
+    for retry in range(6):
+        assert 0 <= policy.backoff(retry) <= min(4.0, 2 ** retry)
+
+    retry = policy.start()
+    assert retry.next_delay(RetryPolicy.TIMEOUT) is not None
+    assert retry.next_delay(RetryPolicy.TIMEOUT) is None  # timeout budget used up
+
+    retry = policy.start()
+    assert retry.next_delay(RetryPolicy.THROTTLED, retry_after=7.5) == 7.5
+    for _ in range(3):
+        assert retry.next_delay(RetryPolicy.SERVER_ERROR) is not None
+    assert retry.next_delay(RetryPolicy.SERVER_ERROR) is None  # fifth attempt was the last
+    assert RetryPolicy.parse_budgets(" timeout=1, server_error=2 ") == {'timeout': 1, 'server_error': 2}
+
+def test_circuit_breaker_transitions():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()  # the single half-open probe
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.recovery_timeout == 20
+
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.recovery_timeout == 10
+    assert breaker.stats() == {'state': 'closed', 'times_opened': 2, 'outage_seconds': 30.0}
+
+@pytest.mark.asyncio
+async def test_pipeline_pauses_during_outage_and_recovers(monkeypatch):
+    hits = {'down': 0, 'up': 0}
+    outage = {'active': True}
+
+    async def chat(request):
+        if outage['active']:
+            hits['down'] += 1
+            return web.Response(status=503, text="down")
+        hits['up'] += 1
+        return web.json_response({'choices': [{'message': {'content': '译文'}}]})
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    monkeypatch.setattr(Config, 'MAX_CONCURRENCY', 5)
+    monkeypatch.setattr(Config, 'BREAKER_FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(Config, 'BREAKER_RECOVERY_SECONDS', 0.2)
+    monkeypatch.setattr(Config, 'RETRY_ATTEMPTS', 4)
+    monkeypatch.setattr(Config, 'RETRY_BASE_DELAY', 0.01)
+
+    async def end_outage():
+        await asyncio.sleep(0.5)
+        outage['active'] = False
+
+    translator = Translator()
+    try:
+        results, _ = await asyncio.gather(
+            asyncio.gather(*(translator.translate(f"Block {i}") for i in range(30))),
+            end_outage()
+        )
+        assert results == ['译文'] * 30
+        # Without the breaker every block would hit the dead backend up to 4 times
+        assert hits['down'] < 15
+        assert translator.breaker.times_opened >= 1
+        assert translator.breaker.state == CircuitBreaker.CLOSED
+    finally:
+        await translator.close()
+        await server.close()
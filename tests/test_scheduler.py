@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from core.scheduler import WorkQueue, group_priority
+
+def test_group_priority():
+    texts = ["a" * 40, "b" * 400, "c" * 4]
+    groups = [[0], [1], [2]]
+    assert sorted(groups, key=group_priority('longest_first', texts)) == [[1], [0], [2]]
+    assert sorted(groups, key=group_priority('shortest_first', texts)) == [[2], [0], [1]]
+    assert sorted(groups, key=group_priority('document', texts)) == groups
+    with pytest.raises(ValueError):
+        group_priority('random', texts)
+
+@pytest.mark.asyncio
+async def test_work_queue_runs_in_priority_order_with_bounded_workers():
+    queue = WorkQueue(workers=2)
+    for item, priority in [("c", 3), ("a", 1), ("b", 2), ("a2", 1), ("d", 4)]:
+        queue.put(item, priority)
+    order = []
+    running = 0
+    peak = 0
+
+    async def handler(item):
+        nonlocal running, peak
+        order.append(item)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await queue.run(handler)
+    assert order == ["a", "a2", "b", "c", "d"]
+    assert peak == 2
+    assert len(queue) == 0
+
+@pytest.mark.asyncio
+async def test_work_queue_propagates_errors():
+    queue = WorkQueue(workers=3)
+    for i in range(10):
+        queue.put(i)
+
+    cancelled = []
+
+    async def handler(item):
+        if item == 0:
+            raise RuntimeError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+
+    with pytest.raises(RuntimeError):
+        await queue.run(handler)
+    # The workers still running are cancelled and nothing else is started
+    assert sorted(cancelled) == [1, 2]
+    assert len(queue) == 7
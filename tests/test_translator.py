@@ -1,12 +1,18 @@
+import asyncio
+import json
+import time
 import pytest
+from config import Config
 from unittest.mock import AsyncMock, patch
-from core.translator import Translator
+from core.translator import Translator, split_segments
+from core.memory import TranslationMemory
 
 @pytest.mark.asyncio
 async def test_translate_success():
     with patch('aiohttp.ClientSession.post') as mock_post:
         mock_response = AsyncMock()
         mock_response.status = 200
+        mock_response.headers = {}
         mock_response.json.return_value = {
             'choices': [{'message': {'content': '你好'}}]
         }
@@ -21,3 +27,212 @@ async def test_translate_empty():
     translator = Translator()
     result = await translator.translate("")
     assert result == ""
+
+@pytest.mark.asyncio
+async def test_translate_uses_precomputed_terms(tmp_path):
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text("redshift\t红移\nquasar\t类星体\n", encoding="utf-8")
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '类星体'}}]
+        }
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator(str(glossary_file))
+        with patch.object(translator.glossary, 'get_relevant_terms') as mock_match:
+            result = await translator.translate("A quasar", term_ids=[1])
+            mock_match.assert_not_called()
+        assert result == "类星体"
+        system_prompt = mock_post.call_args.kwargs['json']['messages'][0]['content']
+        assert "quasar → 类星体" in system_prompt
+        assert "redshift" not in system_prompt.split("specific glossary")[-1]
+        await translator.close()
+
+@pytest.mark.asyncio
+async def test_translate_uses_translation_memory(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '你好'}}]
+        }
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator(memory=memory)
+        assert await translator.translate("Hello") == "你好"
+        assert await translator.translate("Hello ") == "你好"
+        assert mock_post.call_count == 1
+        assert (memory.hits, memory.misses) == (1, 1)
+
+        # Failures are never cached
+        mock_response.status = 400
+        mock_response.text.return_value = "bad request"
+        assert await translator.translate("Goodbye") == "[Translation Error: 400]"
+        assert memory.stats()['entries'] == 1
+        await translator.close()
+    memory.close()
+
+@pytest.mark.asyncio
+async def test_translation_memory_keys_on_answering_model(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {'choices': [{'message': {'content': '你好'}}]}
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator(memory=memory)
+        translator.pool.endpoints[0].model = "pool-model"
+        assert await translator.translate("Hello") == "你好"
+        assert mock_post.call_args.kwargs['json']['model'] == "pool-model"
+        assert memory.stats()['models'] == {"pool-model": 1}
+        assert memory.get(memory.make_key("Hello", Config.MODEL_NAME, Config.SYSTEM_PROMPT)) is None
+
+        assert await translator.translate("Hello") == "你好"
+        assert mock_post.call_count == 1
+        await translator.close()
+    memory.close()
+
+def test_split_segments():
+    response = "<<<SEGMENT 1>>>\n第一段\n\n<<<SEGMENT 2>>>\n第二段\n第二行\n"
+    assert split_segments(response, 2) == ["第一段", "第二段\n第二行"]
+    assert split_segments(response, 3) is None
+    assert split_segments("前言\n" + response, 2) is None
+    assert split_segments("<<<SEGMENT 2>>>\nB\n<<<SEGMENT 1>>>\nA", 2) is None
+    assert split_segments("<<<SEGMENT 1>>>\n\n<<<SEGMENT 2>>>\nB", 2) is None
+
+@pytest.mark.asyncio
+async def test_translate_packed(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '<<<SEGMENT 1>>>\n你好\n\n<<<SEGMENT 2>>>\n世界'}}]
+        }
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator(memory=memory)
+        memory.put(memory.make_key("Cached", Config.MODEL_NAME, Config.SYSTEM_PROMPT), "Cached", "缓存", Config.MODEL_NAME)
+
+        results = await translator.translate_packed(["Hello", "Cached", "World"])
+        assert results == ["你好", "缓存", "世界"]
+        payload = mock_post.call_args.kwargs['json']
+        assert "<<<SEGMENT 2>>>\nWorld" in payload['messages'][1]['content']
+        assert Config.PACK_INSTRUCTION in payload['messages'][0]['content']
+
+        # Segments were made under the packed prompt, so they are not served to single-block lookups
+        assert memory.stats()['entries'] == 1
+        mock_response.json.return_value = {'choices': [{'message': {'content': '世界'}}]}
+        assert await translator.translate("World") == "世界"
+        assert mock_post.call_count == 2
+
+        # Marker mismatch asks the caller to fall back
+        mock_response.json.return_value = {'choices': [{'message': {'content': '你好 世界'}}]}
+        assert await translator.translate_packed(["Hi", "There"]) is None
+        await translator.close()
+    memory.close()
+
+def make_sse_app(chunks, delay_before=0.0, stall_after=None):
+    from aiohttp import web
+
+    async def chat(request):
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        await asyncio.sleep(delay_before)
+        for n, chunk in enumerate(chunks):
+            if stall_after is not None and n == stall_after:
+                await asyncio.sleep(10)
+            event = {'choices': [{'delta': {'content': chunk}}]}
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+        await response.write(b'data: {"choices": [], "usage": {"completion_tokens": 3, "total_tokens": 40}}\n\n')
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    return app
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("delay_before, stall_after, expected", [
+    (0.0, None, "你好，世界"),
+    (1.0, None, "[Translation Failed]"),   # no first token in time
+    (0.0, 1, "[Translation Failed]"),      # stalls between tokens
+])
+async def test_streaming_timeouts(monkeypatch, delay_before, stall_after, expected):
+    from aiohttp.test_utils import TestServer
+    monkeypatch.setattr(Config, 'STREAM_RESPONSES', True)
+    monkeypatch.setattr(Config, 'FIRST_TOKEN_TIMEOUT', 0.3)
+    monkeypatch.setattr(Config, 'INTER_TOKEN_TIMEOUT', 0.3)
+    monkeypatch.setattr(Config, 'RETRY_ATTEMPTS', 2)
+
+    server = TestServer(make_sse_app(["你好", "，", "世界"], delay_before, stall_after))
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    translator = Translator()
+    try:
+        started = time.monotonic()
+        assert await translator.translate("Hello, world") == expected
+        assert time.monotonic() - started < 3  # never waits for TIMEOUT_SECONDS
+        stats = translator.streaming_stats()
+        if expected.startswith("[Translation"):
+            assert stats is None
+        else:
+            assert stats['requests'] == 1
+            assert stats['ttft_p50'] < 0.3
+    finally:
+        await translator.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_streaming_stats_count_a_packed_request_once(monkeypatch):
+    from aiohttp.test_utils import TestServer
+    monkeypatch.setattr(Config, 'STREAM_RESPONSES', True)
+    monkeypatch.setattr(Config, 'MASK_SPANS', False)
+
+    server = TestServer(make_sse_app(["<<<SEGMENT 1>>>\n你好\n\n", "<<<SEGMENT 2>>>\n世界"]))
+    await server.start_server()
+    monkeypatch.setattr(Config, 'BASE_URL', str(server.make_url('/v1')))
+    translator = Translator()
+    try:
+        assert await translator.translate_packed(["Hello", "World"]) == ["你好", "世界"]
+        stats = translator.streaming_stats()
+        assert stats['requests'] == 1
+        assert stats['blocks'] == 2
+    finally:
+        await translator.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_prefix_cache_layout_keeps_system_prompt_static(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, 'PROMPT_LAYOUT', 'prefix_cache')
+    glossary_file = tmp_path / "glossary.txt"
+    glossary_file.write_text("redshift\t红移\nquasar\t类星体\n", encoding="utf-8")
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '译文'}}],
+            'usage': {'prompt_tokens': 500, 'completion_tokens': 20, 'total_tokens': 520,
+                      'prompt_tokens_details': {'cached_tokens': 384}}
+        }
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator(str(glossary_file))
+        await translator.translate("A quasar")
+        await translator.translate("The redshift")
+        first, second = (call.kwargs['json']['messages'] for call in mock_post.call_args_list)
+        assert first[0]['content'] == second[0]['content'] == Config.SYSTEM_PROMPT
+        assert "quasar → 类星体" in first[1]['content']
+        assert "redshift → 红移" in second[1]['content']
+        assert second[1]['content'].endswith("Original Text:\nThe redshift\n\nTranslation:")
+        assert (translator.usage.prompt_tokens, translator.usage.cached_tokens) == (1000, 768)
+        await translator.close()
@@ -0,0 +1,84 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from config import Config
+from core.translator import Translator
+from core.usage import TokenBudgetExceeded, UsageTracker, format_summary, merge_summaries, parse_prices
+
+def test_parse_prices():
+    prices = parse_prices("gpt-4o-mini=0.15/0.6/0.075, deepseek-chat=0.27/1.1")
+    assert prices['gpt-4o-mini'] == {'prompt': 0.15, 'completion': 0.6, 'cached': 0.075}
+    assert prices['deepseek-chat']['cached'] == 0.27
+    assert parse_prices("") == {}
+
+def test_tracks_stages_models_blocks_and_cost():
+    tracker = UsageTracker(parse_prices("m=1/2/0.5"))
+    tracker.record("m", {'prompt_tokens': 1000, 'completion_tokens': 500,
+                         'prompt_tokens_details': {'cached_tokens': 400}}, 1.0, ["Alpha beta gamma"], glossary_tokens=30)
+    # Packed request: tokens split between the blocks by size
+    tracker.record("m", {'prompt_tokens': 300, 'completion_tokens': 100}, 3.0, ["Short", "A much longer block of text here"])
+    tracker.stage = 'retry'
+    # No usage reported: counted from the estimates
+    tracker.record("other", None, 2.0, ["Alpha beta gamma"], prompt_estimate=50, completion="Alpha beta")
+
+    summary = tracker.summary()
+    translate = summary['stages']['translate']
+    assert (translate['requests'], translate['prompt_tokens'], translate['cached_tokens']) == (2, 1300, 400)
+    assert translate['glossary_tokens'] == 30
+    assert summary['stages']['retry']['estimated_requests'] == 1
+    # (900 uncached * 1 + 400 cached * 0.5 + 600 completion * 2) per million
+    assert summary['models']['m']['cost_usd'] == pytest.approx(0.0023)
+    assert 'cost_usd' not in summary['models']['other']
+    assert summary['latency']['max'] == 3.0
+
+    short, long_ = tracker.per_block(["Short", "A much longer block of text here"])
+    assert short + long_ == 400 and long_ > short
+    # Repeated blocks are attributed to the first occurrence only
+    first, repeat = tracker.per_block(["Alpha beta gamma", "Alpha beta gamma"])
+    assert first > 1500 and repeat == 0
+
+    merged = merge_summaries(summary, summary)
+    assert merged['stages']['translate']['prompt_tokens'] == 2600
+    assert merged['cost_usd'] == pytest.approx(0.0046)
+    assert any(line.startswith("translate: 2 requests") for line in format_summary(summary))
+
+@pytest.mark.asyncio
+async def test_translator_records_usage_per_model():
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '译文'}}],
+            'usage': {'prompt_tokens': 120, 'completion_tokens': 8, 'total_tokens': 128}
+        }
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator()
+        await translator.translate("Hello world")
+        await translator.translate("Hello again")
+        summary = translator.usage.summary()
+        assert summary['models'][Config.MODEL_NAME]['prompt_tokens'] == 240
+        assert summary['stages']['translate']['completion_tokens'] == 16
+        assert translator.usage.per_block(["Hello world"]) == [128]
+        await translator.close()
+
+@pytest.mark.asyncio
+async def test_token_budget_stops_before_overspending():
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.headers = {}
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '译文'}}],
+            'usage': {'prompt_tokens': 400, 'completion_tokens': 100, 'total_tokens': 500}
+        }
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        translator = Translator(token_budget=1200)
+        await translator.translate("First block")
+        await translator.translate("Second block")
+        with pytest.raises(TokenBudgetExceeded):
+            await translator.translate("Third block")
+        assert mock_post.call_count == 2
+        assert translator.usage.total_tokens == 1000
+        await translator.close()